@@ -1,26 +1,119 @@
 #!/usr/bin/python
 
+# Log the lines from a serial port, each prefixed with the time in
+# milliseconds since the epoch, as 'time,line':
+#
+#     ./read_serial.py [--port /dev/ttyACM0] [--baud 9600] [--output NAME]
+#
+# writes to stdout, or with --output to NAME-<date>-<time>-<n>.csv
+# files, rotated every --max-mb megabytes or --max-minutes minutes.
+# Whatever is waiting is read from the port in one call, lines are
+# split in bulk, and the output is written in batches. The lines, bytes
+# and overruns of each second are reported to stderr.
+#
+# Times come from a monotonic clock anchored to the wall clock at
+# startup (see lib/capture.py). A read returns many lines at once, so
+# each line's time is that of the read less the time the bytes after
+# it took to arrive at the baud rate, but never before the line ahead
+# of it, as USB serial ports deliver in bursts.
+
+import argparse
+import os
 import serial
-import io
-import time
-
-ser = serial.Serial(
-    port='/dev/ttyACM0',\
-    baudrate=9600,\
-    parity=serial.PARITY_NONE,\
-    stopbits=serial.STOPBITS_ONE,\
-    bytesize=serial.EIGHTBITS,\
-        timeout=100)
-
-buf = ''
-
-while True:
-    for c in ser.read():
-        if c == '\r' or c == '\n':
-            if len(buf) > 0:
-                print(('%f' % (time.time() * 1000)) + ',' + buf)
-            buf = ''
-        else:
-            buf += c
-
-ser.close()
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import capture
+
+# The port cannot say whether bytes were lost, but if a read finds this
+# much waiting, the driver's buffer was full and it is counted as an
+# overrun.
+_OVERRUN_BYTES = 4095
+
+# Seconds to wait for data before flushing what is buffered anyway.
+_POLL_SECONDS = 0.5
+
+########################################################################
+
+def open_port(port, baud):
+    return serial.Serial(
+        port=port,
+        baudrate=baud,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        bytesize=serial.EIGHTBITS,
+        timeout=_POLL_SECONDS)
+
+class Stdout:
+
+    def write(self, data, now):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    def poll(self, now):
+        pass
+
+    def close(self, now=None):
+        pass
+
+def run(ser, out, clock, baud):
+    # Seconds per byte, at 10 bits a byte.
+    byte_time = 10.0 / baud
+    meter = capture.Meter()
+    buf = bytearray()
+    last = 0.0
+    while True:
+        waiting = ser.in_waiting
+        chunk = ser.read(max(waiting, 1))
+        now = clock.now()
+        if len(chunk) == 0:
+            out.poll(now)
+            meter.report(now)
+            continue
+        buf += chunk
+        (spans, end) = capture.line_spans(buf)
+        times = []
+        for (s, e) in spans:
+            last = max(last, now - (len(buf) - e) * byte_time)
+            times.append(last)
+        view = memoryview(buf)
+        try:
+            data = b''.join(
+                b'%f,' % (t * 1000.0) + view[s:e] + b'\n'
+                for (t, (s, e)) in zip(times, spans))
+        finally:
+            view.release()
+        del buf[:end]
+        out.write(data, now)
+        meter.add(len(spans), len(chunk), now, 1 if waiting >= _OVERRUN_BYTES else 0)
+
+########################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description='Log the lines from a serial port.')
+    parser.add_argument('--port', default='/dev/ttyACM0')
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--output', metavar='NAME', help='write to NAME-<date>-<time>-<n>.csv files')
+    parser.add_argument('--max-mb', type=float, default=64.0, help='start a new file after this size')
+    parser.add_argument('--max-minutes', type=float, default=60.0, help='start a new file after this time')
+    args = parser.parse_args()
+
+    clock = capture.Clock()
+    if args.output is None:
+        out = Stdout()
+    else:
+        out = capture.RotatingWriter(
+            args.output, capture.TEXT_EXTENSION,
+            max_bytes=int(args.max_mb * (1 << 20)),
+            max_seconds=args.max_minutes * 60.0)
+    ser = open_port(args.port, args.baud)
+    try:
+        run(ser, out, clock, args.baud)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        out.close(clock.now())
+        ser.close()
+
+if __name__ == '__main__':
+    main()
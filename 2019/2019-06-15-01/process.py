@@ -1,11 +1,13 @@
 #!/usr/bin/python
 
+import io
 import os
-import csv
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
-from numpy import convolve
-import bisect
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import telemetry
 
 ########################################################################
 
@@ -15,44 +17,23 @@ def pressure_count_to_value_hsc(count, fss, is_gage):
     n_ratio = (count * 1.0) / (pow(2, 14) * 1.0)
     return p_min + 1.25 * (n_ratio - 0.1) * (p_max - p_min)
 
-def strings_to_floats(strings):
-    r = []
-    for s in strings:
-        r.append(float(s))
-    return r
-        
-def read(filehandle, cols):
-
-    result = {}
-    for col in cols:
-        result[col] = []
-
-    for row in csv.reader(filehandle, delimiter=','):
-        try:
-            r = strings_to_floats(row)
-        except:
-            continue
-        if len(r) < len(cols):
-            continue
-        for i in range(0, len(cols)):
-            result[cols[i]].append(r[i])
-
-    return result
-
 ########################################################################
 
+# The pressure rows of the log are 'time,p,c0,c1,c2'; the other rows
+# are dropped and the 'p' removed.
+
 def read_pressures():
 
-    (cin, cout) = os.popen2('cat data.csv | grep \',p\' | sed \'s/,p//g\'')
-    dataset = read(cout, ['time', 'c0', 'c1', 'c2'])
-    
-    convert = lambda c: pressure_count_to_value_hsc(c, 4000, False)
-    dataset['p0'] = map(convert, dataset['c0'])
-    dataset['p1'] = map(convert, dataset['c1'])
-    dataset['p2'] = map(convert, dataset['c2'])
+    with open('data.csv', 'rb') as f:
+        rows = [line.replace(b',p', b'') for line in f if b',p' in line]
+    dataset = telemetry.read_columns(io.BytesIO(b''.join(rows)), ['time', 'c0', 'c1', 'c2'])
+
+    dataset['p0'] = pressure_count_to_value_hsc(dataset['c0'], 4000, False)
+    dataset['p1'] = pressure_count_to_value_hsc(dataset['c1'], 4000, False)
+    dataset['p2'] = pressure_count_to_value_hsc(dataset['c2'], 4000, False)
+
+    dataset['time'] = dataset['time'] / 1000 / 60 / 60
 
-    dataset['time'] = map(lambda x: x / 1000 / 60 / 60, dataset['time'])
-    
     return dataset
 
 ########################################################################
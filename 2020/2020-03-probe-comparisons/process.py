@@ -5,103 +5,20 @@ import matplotlib
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 import math
+import os
+import sys
 import numpy as np
 import scipy.optimize as spo
 
-########################################################################
-
-# This is the core formula that computes the pressure at a given point
-# on a sphere as a function of angular offset from the stagnation point.
-# The result is a ratio of the stagnation pressure _q_. The angle is
-# given in radians.
-
-def sphere_pressure_coefficient_polar(angle):
-    def cos_sq(x):
-        y = math.cos(x)
-        return y * y
-    return 1.0 - 9.0 / 4.0 * cos_sq(angle - math.pi / 2.0);
-
-# This formula takes two angles, alpha and beta, and computes the
-# pressure coefficient at the given point using the distance formula.
-
-def sphere_pressure_coefficient_cartesian(alpha, beta):
-    return sphere_pressure_coefficient_polar(
-        math.sqrt(alpha * alpha + beta * beta))
-
-########################################################################
-
-# Subsequent functions refer to two probe geometries. These are:
-#
-# ** Probe v1 **
-#
-# This is a 5-hole sphere plus a static source. The raw measurements are:
-#     (dp0, dpA, dpB)
-# where the pressures are defined as:
-#     dp0 = (center hole) - (static)
-#     dpA = (lower hole) - (upper hole)
-#     dpB = (right hole) - (left hole)
-#
-# ** Probe v2 **
-#
-# This is a 5-hole probe where the static pressure is inferred from one
-# hole on the centerline at 90 degrees from the centerline, on the bottom
-# of the spherical nose. The raw measurements are:
-#     (dp0, dpA, dpB)
-# where the pressures are defined as:
-#     dp0 = (center hole) - (bottom 90 degree hole)
-#     dpA = (lower hole) - (upper hole)
-#     dpB = (right hole) - (left hole)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import probemodel
+import probetable
 
 ########################################################################
 
-# The following functions takes a triple of airflow parameters
-#     (alpha, beta, q)
-# where alpha and beta are in radians, and q can be in any units but,
-# for the purposes of this module, we always use pascals. They return
-# the expected "raw" measurements from potential flow theory.
-
-# Probe v1 version
-
-def v1_probe_data2raw(alpha, beta, q):
-    p0 = q * sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta)
-    pUpr = q * sphere_pressure_coefficient_cartesian(
-        alpha - math.pi / 4,
-        beta)
-    pLwr = q * sphere_pressure_coefficient_cartesian(
-        alpha + math.pi / 4,
-        beta)
-    pLft = q * sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta - math.pi / 4)
-    pRgt = q * sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta + math.pi / 4)
-    return [p0, pLwr - pUpr, pRgt - pLft]
-
-# Probe v2 version
-
-def v2_probe_data2raw(alpha, beta, q):
-    p0 = q * sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta)
-    pUpr = q * sphere_pressure_coefficient_cartesian(
-        alpha - math.pi / 4,
-        beta)
-    pLwr = q * sphere_pressure_coefficient_cartesian(
-        alpha + math.pi / 4,
-        beta)
-    pBtm = q * sphere_pressure_coefficient_cartesian(
-        alpha + math.pi / 2,
-        beta)
-    pLft = q * sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta - math.pi / 4)
-    pRgt = q * sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta + math.pi / 4)
-    return [p0 - pBtm, pLwr - pUpr, pRgt - pLft]
+# The probe geometries and the potential flow model of their "raw"
+# measurements, v1_probe_data2raw() and v2_probe_data2raw(), are in
+# probemodel.py.
 
 ########################################################################
 
@@ -132,21 +49,19 @@ def generic_probe_raw2data(dp0, dpa, dpb, data2raw):
 # Probe v1 version
 
 def v1_probe_raw2data(dp0, dpa, dpb):
-    return generic_probe_raw2data(dp0, dpa, dpb, v1_probe_data2raw)
+    return generic_probe_raw2data(dp0, dpa, dpb, probemodel.v1_probe_data2raw)
     
 # Probe v2 version
 
 def v2_probe_raw2data(dp0, dpa, dpb):
-    return generic_probe_raw2data(dp0, dpa, dpb, v2_probe_data2raw)
+    return generic_probe_raw2data(dp0, dpa, dpb, probemodel.v2_probe_data2raw)
 
 ########################################################################
 
 # Plot flow data versus pressure ratios
 
 def plotpressures(ra0, rb0, flow_data, pov_angle, var_name, title, filename):
-    def radius(a, b):
-        return a * a + b * b
-    r = np.vectorize(radius)(ra0, rb0)
+    r = ra0 * ra0 + rb0 * rb0
 
     color_dimension = r
     minn, maxx = color_dimension.min(), color_dimension.max()
@@ -174,18 +89,28 @@ def plotpressures(ra0, rb0, flow_data, pov_angle, var_name, title, filename):
 ########################################################################    
 
 # Plot calibration surfaces for a probe configuration with the given
-# "raw2data" function.
+# "raw2data" function. The surfaces are read from an inverse table for
+# the probe, which is built with "raw2data" on the first run, and again
+# whenever the probe model changes, and saved next to this script for
+# later runs. The table's error against "raw2data" is measured when it
+# is built.
 
 def plot_calibration(name, raw2data):
-    ra0 = np.arange(-1.25, 1.25, .025)
-    rb0 = np.arange(-1.25, 1.25, .025)
-    ra0, rb0 = np.meshgrid(ra0, rb0)
+    table = probetable.load_or_build(
+        name + '_inverse_table.npz', raw2data, key=probemodel.model_key(name))
+
+    error = table['error']
+    print('%s inverse table error: alpha max=%.4f rms=%.4f deg, beta max=%.4f rms=%.4f deg, dp0/q max=%.5f rms=%.5f' % (
+        name,
+        math.degrees(error['alpha'][0]), math.degrees(error['alpha'][1]),
+        math.degrees(error['beta'][0]), math.degrees(error['beta'][1]),
+        error['dp0_over_q'][0], error['dp0_over_q'][1]))
 
-    def alphabeta(ra0, rb0):
-        r = raw2data(1.0, ra0, rb0)
-        return (math.degrees(r[0]), math.degrees(r[1]), r[2])
+    ra0, rb0 = np.meshgrid(table['ra0'], table['rb0'])
 
-    (alpha, beta, q) = np.vectorize(alphabeta)(ra0, rb0)
+    (alpha, beta, q) = probetable.lookup(table, np.ones(ra0.shape), ra0, rb0)
+    alpha = np.degrees(alpha)
+    beta = np.degrees(beta)
 
     plotpressures(ra0, rb0, alpha, 85,
                   "alpha (degrees)",
@@ -1,29 +1,20 @@
 #!/usr/bin/python
 
-import csv
+import os
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import cache
+
 def read_results(filename):
-    result = {}
-    result['time'] = []
-    result['voltage'] = []
-    result['current'] = []
-    start = -1
-    for row in csv.reader(open(filename), delimiter=','):
-        try:
-            time = float(row[0]) / 3600.0
-            if start < 0:
-                start = time
-                time = 0.0
-            else:
-                time = time - start
-            voltage = float(row[2])
-            current = float(row[3])
-        except:
-            continue
-        result['time'].append(time)
-        result['voltage'].append(voltage)
-        result['current'].append(current)
+    result = cache.read_columns(
+        filename,
+        ['time', 'voltage', 'current'],
+        usecols=[0, 2, 3])
+    result['time'] = result['time'] / 3600.0
+    if len(result['time']) > 0:
+        result['time'] = result['time'] - result['time'][0]
     return result
 
 def plot(filename):
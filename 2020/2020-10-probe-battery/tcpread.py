@@ -1,20 +1,144 @@
+#!/usr/bin/python
+
+# Read the probe's sentence stream over TCP.
+#
+#     ./tcpread.py [--host HOST] [--port PORT]
+#
+# as before, prints every sentence and appends each $B (battery)
+# sentence to data.csv as 'time,sentence'.
+#
+#     ./tcpread.py --capture NAME [--prefix '$A'] [--text] [--print SECONDS]
+#
+# records sentences at full rate: the socket is read in large chunks,
+# each chunk's sentences stamped with one time, and written in batches
+# to NAME-<date>-<time>-<n>.cap binary files (see lib/capture.py),
+# rotated every --max-mb megabytes or --max-minutes minutes. --text also writes
+# the 'time,sentence' text to matching .csv files. Nothing is printed
+# but a line of rates to stderr every second, unless --print asks for
+# at most one sentence every SECONDS.
+#
+#     ./tcpread.py --dump FILE.cap
+#
+# prints a capture file as 'time,sentence' text.
+#
+# Times are seconds since the epoch, from a monotonic clock anchored to
+# the wall clock at startup. A dropped connection is reopened.
+
+import argparse
+import os
 import socket
-import string
+import sys
 import time
 
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s.connect(('192.168.4.1', 80))
-f = s.makefile()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import capture
+
+_CHUNK_SIZE = 65536
+
+# Seconds to wait for data before flushing what is buffered anyway, and
+# before reconnecting after a failure.
+_POLL_SECONDS = 0.5
+_RECONNECT_SECONDS = 1.0
+
+########################################################################
+
+# The sentences received, as lists of lines, each with the time its
+# chunk arrived, forever.
+
+def read_chunks(host, port, clock):
+    while True:
+        try:
+            s = socket.create_connection((host, port), timeout=5.0)
+        except OSError as e:
+            sys.stderr.write('Connecting to %s:%d: %s\n' % (host, port, e))
+            time.sleep(_RECONNECT_SECONDS)
+            continue
+        s.settimeout(_POLL_SECONDS)
+        pending = b''
+        try:
+            while True:
+                try:
+                    chunk = s.recv(_CHUNK_SIZE)
+                except socket.timeout:
+                    yield clock.now(), []
+                    continue
+                if len(chunk) == 0:
+                    raise ConnectionError('connection closed')
+                (lines, pending) = capture.split_lines(pending, chunk)
+                yield clock.now(), lines
+        except OSError as e:
+            sys.stderr.write('Reading from %s:%d: %s\n' % (host, port, e))
+        finally:
+            s.close()
+        time.sleep(_RECONNECT_SECONDS)
+
+def battery_log(args, clock):
+    with open('data.csv', 'ab') as of:
+        for (t, lines) in read_chunks(args.host, args.port, clock):
+            for line in lines:
+                print(line.decode('ascii', 'replace'))
+            battery = [l for l in lines if l.startswith(b'$B')]
+            if len(battery) > 0:
+                of.write(capture.encode_text(t, battery))
+                of.flush()
+
+def capture_stream(args, clock):
+    prefix = None if args.prefix is None else args.prefix.encode('ascii')
+    c = capture.Capture(
+        args.capture,
+        text=args.text,
+        max_bytes=None if args.max_mb is None else int(args.max_mb * (1 << 20)),
+        max_seconds=None if args.max_minutes is None else args.max_minutes * 60.0)
+    printer = None if args.print is None else capture.RateLimiter(args.print)
+    meter = capture.Meter()
+    try:
+        for (t, lines) in read_chunks(args.host, args.port, clock):
+            if prefix is not None:
+                lines = [l for l in lines if l.startswith(prefix)]
+            if len(lines) == 0:
+                c.poll(t)
+                meter.report(t)
+                continue
+            c.add(t, lines)
+            meter.add(len(lines), sum(len(l) for l in lines), t)
+            if printer is not None and printer.ready(t):
+                print('%.3f %s' % (t, lines[-1].decode('ascii', 'replace')))
+    finally:
+        c.close(clock.now())
+        sys.stderr.write('Wrote %s\n' % (', '.join(c.files())))
+
+def dump(filename):
+    (times, lines) = capture.read_records(filename)
+    out = sys.stdout.buffer
+    for (t, l) in zip(times, lines):
+        out.write(capture.encode_text(t, [l]))
+
+########################################################################
 
-of = open('data.csv', 'a')
+def main():
+    parser = argparse.ArgumentParser(description='Read the probe\'s sentence stream over TCP.')
+    parser.add_argument('--host', default='192.168.4.1')
+    parser.add_argument('--port', type=int, default=80)
+    parser.add_argument('--capture', metavar='NAME', help='record to NAME-<date>-<time>-<n>.cap files')
+    parser.add_argument('--prefix', help='record only sentences starting with this, e.g. $A')
+    parser.add_argument('--text', action='store_true', help='also write .csv text files')
+    parser.add_argument('--print', type=float, metavar='SECONDS', help='print a sentence every SECONDS')
+    parser.add_argument('--max-mb', type=float, default=64.0, help='start a new file after this size')
+    parser.add_argument('--max-minutes', type=float, default=60.0, help='start a new file after this time')
+    parser.add_argument('--dump', metavar='FILE', help='print a capture file as text')
+    args = parser.parse_args()
 
-while True:
-    line = string.strip(f.readline())
-    print(line)
-    if line.find('$B') == 0:
-        of.write(str(time.time()))
-        of.write(",")
-        of.write(line)
-        of.write("\n")
-        of.flush()
+    if args.dump is not None:
+        dump(args.dump)
+        return
+    clock = capture.Clock()
+    try:
+        if args.capture is None:
+            battery_log(args, clock)
+        else:
+            capture_stream(args, clock)
+    except KeyboardInterrupt:
+        pass
 
+if __name__ == '__main__':
+    main()
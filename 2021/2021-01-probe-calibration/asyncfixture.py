@@ -0,0 +1,85 @@
+import asyncio
+import concurrent.futures
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import probestream
+
+class AsyncProbeFixture:
+    '''Represents a probe on a test fixture, for use from asyncio.'''
+
+    async def start(self):
+        '''Start reading the probe's data sentences in the background.'''
+        pass
+
+    async def close(self):
+        pass
+
+    async def moveto(self, az_el):
+        '''Move probe to a given azimuth and elevation in degrees, returning
+        once the move is complete.'''
+        pass
+
+    async def read(self, n, after=None):
+        '''Read a given number of $A data sentences. Returns a list of strings.
+        If 'after' is given, only sentences received after that time.monotonic()
+        value are returned.'''
+        pass
+
+# Drives the real mount, with the motor commands on a worker thread so
+# that the event loop keeps ingesting sentences while the mount moves.
+
+class AsyncExperimentalFixture(AsyncProbeFixture):
+
+    def __init__(self, host=probestream.DEFAULT_HOST, port=probestream.DEFAULT_PORT):
+        # Imported here, as it needs the dxl library.
+        import experimentalfixture
+        # One thread, so commands reach the motor chain one at a time.
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.__mount = experimentalfixture.Mount()
+        self.__stream = probestream.AsyncProbeStream(host, port)
+
+    async def start(self):
+        self.__stream.start()
+
+    async def close(self):
+        await self.__stream.close()
+        self.__executor.shutdown()
+
+    async def moveto(self, az_el):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.__executor, self.__mount.moveto, az_el)
+        self.__stream.mark()
+
+    async def read(self, n, after=None):
+        return await self.__stream.read(n, after)
+
+# A simulated mount in front of a fakeprobe.FakeProbe in the same event
+# loop. Moves take as long as the mount would need at 'speed' degrees
+# per second, with both axes moving at once, and the fake probe's
+# sentences are read over TCP like the real probe's.
+
+class AsyncMockFixture(AsyncProbeFixture):
+
+    def __init__(self, probe, port, speed=60.0):
+        self.__probe = probe
+        self.__port = port
+        self.__speed = speed
+        self.__stream = probestream.AsyncProbeStream('127.0.0.1', port)
+
+    async def start(self):
+        self.__stream.start()
+
+    async def close(self):
+        await self.__stream.close()
+
+    async def moveto(self, az_el):
+        az_el = [max(-45, min(45, a)) for a in az_el]
+        travel = max(abs(az_el[i] - self.__probe.az_el[i]) for i in range(0, 2))
+        await asyncio.sleep(travel / self.__speed)
+        self.__probe.set_az_el(az_el)
+        self.__stream.mark()
+
+    async def read(self, n, after=None):
+        return await self.__stream.read(n, after)
@@ -0,0 +1,113 @@
+import alphabeta
+import probetest
+import asyncio
+import json
+import os.path
+import time
+
+# The asyncio version of an unattended ProbeTest, driving an
+# asyncfixture.AsyncProbeFixture. The fixture ingests the probe's
+# sentences continuously as a task; while the mount moves to each point,
+# the previous point is written to <name>.sweep by a writer task, so
+# moves, settling, reading and writing overlap. Readings are accepted
+# or retried by 'rules' and sized by 'precision', by default
+# probetest.ACCEPT_RULES and probetest.PRECISION, through the same
+# probetest.accept_reading() loop as ProbeTest.
+
+class AsyncProbeTest:
+
+    __statefile = 'state.json'
+
+    __sweep_step = 5
+    __sweep_count = 7
+
+    # Seconds to wait after a move completes before reading.
+    __settle_time = 1.0
+
+    def __init__(self, fixture, settle_time=__settle_time,
+                 rules=probetest.ACCEPT_RULES, precision=probetest.PRECISION):
+        self.__fixture = fixture
+        self.__settle_time = settle_time
+        self.__rules = rules
+        self.__precision = precision
+        self.__zero = [0.0, 0.0]
+        if os.path.isfile(self.__statefile):
+            with open(self.__statefile) as f:
+                self.__zero = json.load(f)['zero']
+
+    # Sweep the given [alpha, beta] points, by default the same grid as
+    # ProbeTest.sweep(). Returns the points that were rejected after all
+    # retries, which are not written.
+
+    async def sweep(self, name, mph, points=None):
+        name = str(name)
+        mph = int(mph)
+        if points is None:
+            points = probetest.sweep_points(self.__sweep_count, self.__sweep_step)
+        start = time.monotonic()
+        failed = []
+        queue = asyncio.Queue()
+        writer = asyncio.create_task(self.__write_loop(queue))
+        move = None
+        try:
+            if len(points) > 0:
+                move = asyncio.create_task(self.__fixture.moveto(self.__az_el(points[0])))
+            for i in range(0, len(points)):
+                alpha_beta = points[i]
+                await move
+                if writer.done():
+                    break
+                v = await self.__read_accepted()
+                if i + 1 < len(points):
+                    move = asyncio.create_task(self.__fixture.moveto(self.__az_el(points[i + 1])))
+                if v is None:
+                    print('Giving up on alpha_beta=%s' % (alpha_beta))
+                    failed.append(alpha_beta)
+                    continue
+                await queue.put((name, mph, alpha_beta, v))
+        finally:
+            if move is not None and not move.done():
+                move.cancel()
+            await queue.put(None)
+            await writer
+        print('Swept %d points in %.1f s, %d rejected: %s' % (
+            len(points), time.monotonic() - start, len(failed), failed))
+        return failed
+
+    # Acquire and write a single point, retrying until it is accepted.
+
+    async def acquire_point(self, name, mph, alpha_beta):
+        await self.__fixture.moveto(self.__az_el(alpha_beta))
+        while True:
+            v = await self.__read_accepted()
+            if v is not None:
+                break
+        probetest.save_point(str(name), int(mph), alpha_beta, v)
+
+    def __az_el(self, alpha_beta):
+        az_el = alphabeta.alpha_beta_to_az_el(alpha_beta)
+        return [
+            az_el[0] + self.__zero[0],
+            az_el[1] + self.__zero[1],
+        ]
+
+    async def __read_accepted(self):
+        await asyncio.sleep(self.__settle_time)
+        steps = probetest.accept_reading(time.monotonic(), self.__rules, self.__precision)
+        try:
+            request = next(steps)
+            while True:
+                request = steps.send(await self.__fixture.read(*request))
+        except StopIteration as e:
+            return e.value
+
+    # Write points as they arrive, off the event loop. A failed write
+    # ends the loop, and the sweep, with its exception.
+
+    async def __write_loop(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            await loop.run_in_executor(None, probetest.save_point, *item)
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+
+# Run an unattended sweep with the asyncio driver:
+#
+#     ./asyncsweep.py name mph [host [port]]
+#     ./asyncsweep.py name mph --fake
+#
+# The first form uses the real mount and the probe at host:port
+# (default 192.168.4.1:80). With --fake, the mount is simulated and the
+# probe is a fakeprobe.FakeProbe on a local port, so the whole pipeline
+# can be exercised without the hardware.
+
+import asyncio
+import sys
+
+import asyncfixture
+import asyncprobetest
+import fakeprobe
+
+async def main(name, mph, args):
+    probe = None
+    if len(args) > 0 and args[0] == '--fake':
+        probe = fakeprobe.FakeProbe(mph)
+        port = await probe.start()
+        fixture = asyncfixture.AsyncMockFixture(probe, port)
+    else:
+        address = {}
+        if len(args) > 0:
+            address['host'] = args[0]
+        if len(args) > 1:
+            address['port'] = int(args[1])
+        fixture = asyncfixture.AsyncExperimentalFixture(**address)
+    await fixture.start()
+    try:
+        await asyncprobetest.AsyncProbeTest(fixture).sweep(name, mph)
+    finally:
+        await fixture.close()
+        if probe is not None:
+            await probe.close()
+
+asyncio.run(main(sys.argv[1], int(sys.argv[2]), sys.argv[3:]))
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+
+# Build calibration surfaces from a sweep file such as hwy101.csv, or a
+# .sweep file written by ProbeTest:
+#
+#     ./calibrate.py hwy101.csv [degree]
+#
+# For each channel (dp0/q, dpA/q, dpB/q) and each mph in the sweep, fits
+# a polynomial correction c(alpha, beta) such that data = c * theory,
+# and writes the coefficients to <sweep>_calibration.json. See
+# lib/calibration.py for the format and for evaluate_surface(), which
+# applies the correction to arrays of flight data.
+
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import calibration
+import groupby
+
+########################################################################
+
+# Read a sweep and average it down to one row per (mph, alpha, beta).
+
+def read_sweep(filename):
+    d = calibration.read_sweep(filename)
+    calibration.add_sweep_ratios(d)
+    return groupby.reduce(d, ['mph', 'alpha', 'beta'], calibration.CHANNELS)
+
+########################################################################
+
+filename = sys.argv[1]
+degree = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+r = read_sweep(filename)
+surfaces = calibration.fit_surfaces(
+    np.radians(r['alpha']),
+    np.radians(r['beta']),
+    r['mph'],
+    dict((c, r[c]) for c in calibration.CHANNELS),
+    calibration.theory(r['alpha'], r['beta']),
+    degree)
+
+output = os.path.splitext(filename)[0] + '_calibration.json'
+calibration.save_surfaces(surfaces, output)
+
+for c in calibration.CHANNELS:
+    for (mph, (before, after)) in zip(surfaces['speeds'], surfaces['rms'][c]):
+        print('%s at %g mph: rms error %.4f theory, %.4f corrected' % (c, mph, before, after))
+print('wrote ' + output)
@@ -1,23 +1,26 @@
 from probefixture import ProbeFixture
 
-import random
+import os
+import sys
 from dxl import *
 from dxl.dxlcore import *
-import time
-import socket
 
-class ExperimentalFixture(ProbeFixture):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import probestream
+
+# The altazimuth mount: two Dynamixel motors on one chain.
+
+class Mount:
 
     __az_id = 1
     __el_id = 2
     __speed = 50
-    
+
     def __init__(self):
         self.__az_el = [0.0, 0.0]
-        self.__seq = 0
         self.__chain = dxlchain.DxlChain('/dev/ttyACM0', rate=1000000)
         self.__chain.get_motor_list()
-        
+
     def moveto(self, az_el):
         print('moveto(%s)' % (az_el))
         self.__az_el = [self.angle_limits(az_el[0]), self.angle_limits(az_el[1])]
@@ -30,22 +33,6 @@ class ExperimentalFixture(ProbeFixture):
             self.count(self.__az_el[1]),
             speed=self.__speed)
 
-    def read(self, n):
-        print('read(%s)' % (n))
-        r = []
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect(('192.168.4.1', 80))
-        f = s.makefile()
-        for i in range(0, n):
-            while True:
-                s = f.readline().strip()
-                fields = s.split(',')
-                if len(fields) > 0 and fields[0] == '$A':
-                    print(s)
-                    r.append(s)
-                    break
-        return r
-            
     def count(self, degrees):
         count = int(float(degrees) / 0.29) + 512
         count = max(0, count)
@@ -56,3 +43,24 @@ class ExperimentalFixture(ProbeFixture):
         degrees = max(degrees, -45)
         degrees = min(degrees, 45)
         return degrees
+
+class ExperimentalFixture(ProbeFixture):
+
+    # The probe's sentences are read continuously from one connection
+    # to host:port; see lib/probestream.py.
+
+    def __init__(self, host=probestream.DEFAULT_HOST, port=probestream.DEFAULT_PORT):
+        self.__mount = Mount()
+        self.__stream = probestream.ProbeStream(host, port)
+        self.__stream.start()
+
+    def close(self):
+        self.__stream.close()
+
+    def moveto(self, az_el):
+        self.__mount.moveto(az_el)
+        # Sentences already received describe the old position.
+        self.__stream.mark()
+
+    def read(self, n, after=None):
+        return self.__stream.read(n, after)
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+
+# A local stand-in for the probe's TCP sentence stream, for running the
+# fixtures and tests without the hardware:
+#
+#     ./fakeprobe.py [port] [mph]
+#
+# serves $A sentences on 127.0.0.1:port (default 8080) at a steady
+# rate. The pressures follow the same v2 potential flow model as
+# MockFixture, at the az/el last set with set_az_el(), with 'noise' Pa
+# of noise on each channel; run standalone, the probe stays at zero.
+
+import asyncio
+import mockfixture
+import random
+import sys
+
+class FakeProbe:
+
+    def __init__(self, mph=60, rate=100.0, noise=2.0):
+        self.az_el = [0.0, 0.0]
+        self.mph = mph
+        self.__rate = rate
+        self.__noise = noise
+        self.__seq = 0
+        self.__server = None
+
+    def set_az_el(self, az_el):
+        self.az_el = [float(az_el[0]), float(az_el[1])]
+
+    # Start serving; with port 0, a free port is picked. Returns the
+    # port.
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.__server = await asyncio.start_server(self.__serve, host, port)
+        return self.__server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    def sentence(self):
+        p = mockfixture.probe_pressures(self.az_el, self.mph)
+        s = '$A,%d,%f,%f,%f,%f,%f\r\n' % (
+            self.__seq,
+            101325.0 + self.__add_noise(),
+            25.0,
+            p['dp0'] + self.__add_noise(),
+            p['dpA'] + self.__add_noise(),
+            p['dpB'] + self.__add_noise(),
+        )
+        self.__seq = self.__seq + 1
+        return s
+
+    def __add_noise(self):
+        return random.gauss(0.0, self.__noise)
+
+    # Send sentences in batches every few milliseconds, keeping to the
+    # rate on average.
+
+    async def __serve(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        period = 0.01
+        start = loop.time()
+        sent = 0
+        try:
+            while True:
+                due = int((loop.time() - start) * self.__rate)
+                if due > sent:
+                    writer.write(''.join(self.sentence() for i in range(sent, due)).encode('ascii'))
+                    await writer.drain()
+                    sent = due
+                await asyncio.sleep(period)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+async def main(port, mph):
+    probe = FakeProbe(mph)
+    port = await probe.start(port=port)
+    print('Serving $A sentences on 127.0.0.1:%d' % (port))
+    await asyncio.Event().wait()
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    mph = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    asyncio.run(main(port, mph))
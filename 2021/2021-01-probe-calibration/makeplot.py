@@ -1,156 +1,46 @@
 #!/usr/bin/python
 
 from mpl_toolkits import mplot3d
-import math
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import sys
-import csv
 import pickle
 
-########################################################################
-
-# This is the core formula that computes the pressure at a given point
-# on a sphere as a function of angular offset from the stagnation point.
-# The result is a ratio of the stagnation pressure _q_. The angle is
-# given in radians.
-
-def sphere_pressure_coefficient_polar(angle):
-    def cos_sq(x):
-        y = math.cos(x)
-        return y * y
-    return 1.0 - 9.0 / 4.0 * cos_sq(angle - math.pi / 2.0);
-
-# This formula takes two angles, alpha and beta, and computes the
-# pressure coefficient at the given point using the distance formula.
-
-def sphere_pressure_coefficient_cartesian(alpha, beta):
-    return sphere_pressure_coefficient_polar(
-        math.sqrt(alpha * alpha + beta * beta))
-
-########################################################################
-
-def v2_probe_theoretical(alpha, beta, scaling=1.0):
-    alpha = math.radians(alpha)
-    beta = math.radians(beta)    
-    p0 = sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta)
-    pUpr = sphere_pressure_coefficient_cartesian(
-        alpha - math.pi / 4,
-        beta)
-    pLwr = sphere_pressure_coefficient_cartesian(
-        alpha + math.pi / 4,
-        beta)
-    pBtm = sphere_pressure_coefficient_cartesian(
-        alpha + math.pi / 2,
-        beta)
-    pLft = sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta - math.pi / 4)
-    pRgt = sphere_pressure_coefficient_cartesian(
-        alpha,
-        beta + math.pi / 4)
-    return {
-        'dp0_q': scaling * (p0 - pBtm),
-        'dpA_q': scaling * (pUpr - pLwr),
-        'dpB_q': scaling * (pRgt - pLft),
-    }
-
-########################################################################
-
-def read(filename):
-    results = {}
-    with open(filename, 'r') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for k in reader.fieldnames: results[k] = []
-        for row in reader:
-            if float(row['dp0']) != 0.0:
-                for k in row.keys():
-                    results[k].append(float(row[k]))
-    return results
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import calibration
+import groupby
 
 ########################################################################
 
-def air_density(p, t_degC):
-    t_K = t_degC + 273.15
-    return p / (287.058 * t_K)
-
-def speed_from_mph(mph):
-    return mph * 0.44704
-
-def q(p, t_degC, mph):
-    return 0.5 * air_density(p, t_degC) * (speed_from_mph(mph) ** 2)
-
-def calculate_ratios(d):
-    d['q'] = []
-    d['dp0_q'] = []
-    d['dpA_q'] = []
-    d['dpB_q'] = []        
-    for i in range(0, len(d['seq'])):
-        d['q'].append(q(d['baro'][i], d['oat'][i], d['mph'][i]))
-    for i in range(0, len(d['seq'])):
-        d['dp0_q'].append(d['dp0'][i] / d['q'][i])
-        d['dpA_q'].append(d['dpA'][i] / d['q'][i])
-        d['dpB_q'].append(d['dpB'][i] / d['q'][i])        
+# Average the given columns, and q, over all samples at each point of
+# the sweep, that is, each (mph, alpha, beta). The result also has the
+# std, min, max and sample count of each point.
 
 def reduce_average(d, column_names):
-    reduced = {}
-    for i in range(0, len(d['seq'])):
-        k = (d['alpha'][i], d['beta'][i])
-        if not reduced.get(k):
-            reduced[k] = {}
-            for n in column_names:
-                reduced[k][n] = {
-                    'count': 0,
-                    'total': 0.0,
-                }
-                reduced[k][n]['count'] = reduced[k][n]['count'] + 1
-                reduced[k][n]['total'] = reduced[k][n]['total'] + d[n][i]
-    r = {
-        'alpha': [],
-        'beta': [],
-    }
-    for n in column_names:
-        r[n] = []
-    for k in reduced.keys():
-        r['alpha'].append(k[0])
-        r['beta'].append(k[1])
-        for n in column_names:
-            r[n].append(reduced[k][n]['total'] / reduced[k][n]['count'])
-    r['q'] = d['q']
-    return r
+    return groupby.reduce(d, ['mph', 'alpha', 'beta'], column_names + ['q'])
         
 ########################################################################
 
 def add_theoreticals(r):
-    r['dp0_q_th'] = []
-    r['dpA_q_th'] = []
-    r['dpB_q_th'] = []
-    for i in range(0, len(r['alpha'])):
-        th = v2_probe_theoretical(r['alpha'][i], r['beta'][i])
-        r['dp0_q_th'].append(th['dp0_q'])
-        r['dpA_q_th'].append(th['dpA_q'])
-        r['dpB_q_th'].append(th['dpB_q'])
+    th = calibration.theory(np.array(r['alpha']), np.array(r['beta']))
+    for v in ['dp0_q', 'dpA_q', 'dpB_q']:
+        r[v + '_th'] = th[v].tolist()
 
 ########################################################################
 
 def add_ratios(r):
-    vars = ['dp0_q', 'dpA_q', 'dpB_q']
-    for v in vars:
-        r[v + '_ratio'] = []
-    for i in range(0, len(r['alpha'])):
-        for v in vars:
-            try:
-                r[v + '_ratio'].append(r[v][i] / r[v + '_th'][i])
-            except:
-                r[v + '_ratio'].append(0)
+    for v in ['dp0_q', 'dpA_q', 'dpB_q']:
+        data = np.array(r[v])
+        th = np.array(r[v + '_th'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r[v + '_ratio'] = np.where(th != 0, data / th, 0).tolist()
         
 ########################################################################
 
 def compute_dataset(filename):
-    d = read(filename)
-    calculate_ratios(d)
+    d = calibration.read_sweep(filename)
+    calibration.add_sweep_ratios(d)
     r = reduce_average(d, ['dp0_q', 'dpA_q', 'dpB_q'])
     add_theoreticals(r)
     add_ratios(r)
@@ -185,28 +75,39 @@ def compare_data_theory(r):
 
 ########################################################################
 
+# The points used to fit each channel. dpA and dpB are zero in theory
+# at alpha = 0 and beta = 0 respectively, so those points say nothing
+# about their scaling.
+
+def scaling_mask(r, v):
+    if v == 'dpA_q':
+        return np.array(r['alpha']) != 0
+    if v == 'dpB_q':
+        return np.array(r['beta']) != 0
+    return np.ones(len(r['alpha']), dtype=bool)
+
+# Total squared error between data and theory for channel 'v' with the
+# theory multiplied by 's', which may be a scalar or an array of scales.
+
 def compute_error(r, v, s):
-    err = 0.0
-    for i in range(0, len(r['alpha'])):
-        if v == 'dpA_q' and r['alpha'][i] == 0:
-            continue
-        if v == 'dpB_q' and r['beta'][i] == 0:
-            continue
-        th = v2_probe_theoretical(r['alpha'][i], r['beta'][i], s)[v]
-        e = r[v][i] - th
-        err = err + (e * e)
-    return err
+    return calibration.scale_error_curve(
+        np.array(r[v]), np.array(r[v + '_th']), s, scaling_mask(r, v))
+
+def fit_scaling(r, v):
+    return calibration.fit_scale(
+        np.array(r[v]), np.array(r[v + '_th']), scaling_mask(r, v))
 
 def plot_scaling(r, v):
-    scalings = []
-    errors = []
-    for s in np.arange(0.1, 1.9, 0.05):
-        scalings.append(s)
-        errors.append(compute_error(r, v, s))
+    scalings = np.arange(0.1, 1.9, 0.05)
+    errors = compute_error(r, v, scalings)
+    best, residuals = fit_scaling(r, v)
+    print('%s best scaling %.3f, rms residual %.4f' % (
+        v, best, np.sqrt(np.mean(residuals * residuals))))
     fig, (ax1) = plt.subplots(1)
     ax1.plot(scalings, errors)
+    ax1.axvline(best, color='orange', linestyle='dashed')
     ax1.set(
-        title=v + ' effect of scaling',
+        title=v + ' effect of scaling (best %.3f)' % best,
         xlabel="Scaling applied to theory",
         ylabel='Total squared error b/w data and theory')
     ax1.xaxis.set_ticks(np.arange(0.1, 1.9, 0.1))
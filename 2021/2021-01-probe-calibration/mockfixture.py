@@ -1,46 +1,179 @@
 from probefixture import ProbeFixture
 
-import random
+import alphabeta
+import numpy
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import calibration
+import probemodel
+
+# A simulated probe on a simulated mount, for running ProbeTest end to
+# end without the hardware. The commanded az/el, less the mount's 'zero'
+# (where the probe sees zero alpha and beta), is converted to alpha and
+# beta, and the $A sentences carry the pressures of the v2 potential
+# flow model at the air speed set with set_mph(), with:
+#
+#     noise       -- standard deviation of each channel, in its units
+#     resolution  -- the sensor's quantization step, per channel
+#     rate        -- sentences per second
+#     drop        -- the fraction of sentences lost; their sequence
+#                    numbers are skipped, as with the real stream
+#     latency     -- seconds from a move command until the motors start
+#     speeds      -- degrees per second of each motor, both moving at
+#                    once
+#
+# Sentences read while the mount is moving show the probe where it is
+# at the time, not where it is going.
+#
+# With 'realtime' set, the sentences come at 'rate' on the wall clock,
+# a read waits for them as it would for the probe, and moves take as
+# long as they would. Otherwise the simulation keeps its own clock and
+# runs as fast as it can: a move returns once the mount would have
+# stopped, and a read takes the next sentences from then on, however
+# long they would have taken to arrive. Use ProbeTest(..., settle_time=0)
+# with it. elapsed() gives the time the run would have taken.
+
+DEFAULT_NOISE = {
+    'baro': 2.0,
+    'oat': 0.05,
+    'dp0': 2.0,
+    'dpA': 2.0,
+    'dpB': 2.0,
+}
+
+DEFAULT_RESOLUTION = {
+    'baro': 1.0,
+    'oat': 0.01,
+    'dp0': 0.1,
+    'dpA': 0.1,
+    'dpB': 0.1,
+}
+
+_CHANNELS = ['baro', 'oat', 'dp0', 'dpA', 'dpB']
+
+# The channels of the $A sentence at the mount positions 'az_el' (an
+# array of shape (..., 2)), without noise. Note that dpA is (upper
+# hole) - (lower hole), the opposite sign to probemodel.py, as the probe
+# reports it.
+
+def probe_pressures(az_el, mph, zero=(0.0, 0.0), baro=101325.0, oat=25.0):
+    alpha_beta = alphabeta.az_el_to_alpha_beta(numpy.asarray(az_el, dtype=numpy.float64) - numpy.asarray(zero))
+    alpha_beta = numpy.radians(alpha_beta)
+    q = calibration.q(baro, oat, mph)
+    c = probemodel.probe_channels(alpha_beta[..., 0], alpha_beta[..., 1], q, 'v2')
+    return {
+        'dp0': c['dp0'],
+        'dpA': -c['dpa'],
+        'dpB': c['dpb'],
+    }
 
 class MockFixture(ProbeFixture):
 
-    def __init__(self):
-        self.az_el = [0.0, 0.0]
-        self.mph = 0
-        self.seq = 0
-        
-    def moveto(self, az_el):
-        if az_el[0] > 45: az_el[0] = 45
-        if az_el[1] > 45: az_el[1] = 45
-        self.az_el = az_el
+    def __init__(
+            self, mph=0, zero=(0.0, 0.0), noise=DEFAULT_NOISE, resolution=DEFAULT_RESOLUTION,
+            rate=50.0, drop=0.0, latency=0.1, speeds=(33.3, 33.3),
+            realtime=False, baro=101325.0, oat=25.0, seed=None, limit=45.0):
+        self.mph = mph
+        self.zero = [float(zero[0]), float(zero[1])]
+        self.__noise = dict(DEFAULT_NOISE)
+        self.__noise.update(noise)
+        self.__resolution = dict(DEFAULT_RESOLUTION)
+        self.__resolution.update(resolution)
+        self.__rate = float(rate)
+        self.__drop = drop
+        self.__latency = latency
+        self.__speeds = numpy.asarray(speeds, dtype=numpy.float64)
+        self.__realtime = realtime
+        self.__air = {'baro': baro, 'oat': oat}
+        self.__random = numpy.random.default_rng(seed)
+        self.__limit = limit
+        # The current move: where from, where to, and when it started
+        # on the simulation clock.
+        self.__from = numpy.zeros(2)
+        self.__to = numpy.zeros(2)
+        self.__moved_at = 0.0
+        # Sentence k is sent at time __start + k / rate; __next is the
+        # next one a read may return.
+        self.__now = 0.0
+        self.__start = self.__clock()
+        self.__next = 0
+
+    def __clock(self):
+        if self.__realtime:
+            return time.monotonic()
+        return self.__now
+
+    # Seconds since the fixture was created, on the simulation clock.
+
+    def elapsed(self):
+        return self.__clock() - self.__start
 
     def set_mph(self, mph):
-        self.mph = int(mph)
-        
-    def read(self, n):
-        q = self.q()
-        dpA = (float(self.az_el[1]) / 45.0) * q + 15
-        dpB = (float(self.az_el[0]) / 45.0) * q + 15
-        dp0 = q - dpA - dpB
-        oat = 25.0
-        baro = 101325.0
-        data = []
-        for i in range(0, n):
-            s = '$A,%d,%f,%f,%f,%f,%f' % (
-                self.seq,
-                self.noise(baro),
-                self.noise(oat),
-                self.noise(dp0),
-                self.noise(dpA),
-                self.noise(dpB),
-            )
-            data.append(s)
-            self.seq = self.seq + 1
-        self.seq = self.seq + int(random.uniform(1000, 2000))
-        return data
-            
-    def q(self):
-        return 0.5 * 1.225 * ((self.mph * 0.44704) ** 2)
-
-    def noise(self, value):
-        return value + random.uniform(-1.0, 1.0) * value * 0.05
+        self.mph = mph
+
+    # Where the mount is at the given times on the simulation clock.
+
+    def position(self, t):
+        t = numpy.asarray(t, dtype=numpy.float64)[..., None]
+        d = self.__to - self.__from
+        moved = numpy.clip((t - self.__moved_at - self.__latency) * self.__speeds, 0.0, numpy.abs(d))
+        return self.__from + numpy.sign(d) * moved
+
+    def __stopped_at(self):
+        d = numpy.abs(self.__to - self.__from) / self.__speeds
+        return self.__moved_at + self.__latency + numpy.max(d)
+
+    def moveto(self, az_el):
+        now = self.__clock()
+        self.__from = self.position(now)
+        self.__to = numpy.clip(numpy.asarray(az_el, dtype=numpy.float64), -self.__limit, self.__limit)
+        self.__moved_at = now
+        if self.__realtime:
+            time.sleep(max(0.0, self.__stopped_at() - now))
+        else:
+            self.__now = self.__stopped_at()
+        # As ExperimentalFixture, read only sentences sent after the move.
+        self.__next = max(self.__next, self.__index(self.__clock()))
+
+    # The index of the first sentence sent after time t.
+
+    def __index(self, t):
+        return int(numpy.floor((t - self.__start) * self.__rate)) + 1
+
+    def read(self, n, after=None):
+        if after is not None and self.__realtime:
+            self.__next = max(self.__next, self.__index(after))
+        lines = []
+        while len(lines) < n:
+            # Enough sentences that, after the drops, n are likely left.
+            k = self.__next + numpy.arange(0, int((n - len(lines)) / (1.0 - self.__drop)) + 1)
+            k = k[self.__random.random(len(k)) >= self.__drop][0:n - len(lines)]
+            if len(k) == 0:
+                self.__next = self.__next + 1
+                continue
+            t = self.__start + k / self.__rate
+            lines.extend(self.__sentences(k, t))
+            self.__next = int(k[-1]) + 1
+            if self.__realtime:
+                time.sleep(max(0.0, t[-1] - time.monotonic()))
+            else:
+                self.__now = max(self.__now, t[-1])
+        return lines
+
+    def __sentences(self, seq, t):
+        v = probe_pressures(self.position(t), self.mph, self.zero, self.__air['baro'], self.__air['oat'])
+        v['baro'] = numpy.full(len(seq), self.__air['baro'])
+        v['oat'] = numpy.full(len(seq), self.__air['oat'])
+        columns = []
+        for c in _CHANNELS:
+            x = v[c] + self.__random.normal(0.0, self.__noise[c], len(seq))
+            if self.__resolution[c] > 0:
+                x = numpy.round(x / self.__resolution[c]) * self.__resolution[c]
+            columns.append(x)
+        return [
+            '$A,%d,%f,%f,%f,%f,%f' % ((s,) + tuple(r))
+            for (s, r) in zip(seq.tolist(), numpy.column_stack(columns).tolist())
+        ]
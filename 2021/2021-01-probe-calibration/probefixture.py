@@ -9,6 +9,8 @@ class ProbeFixture:
         '''Move probe to a given azimuth and elevation in degrees.'''
         pass
 
-    def read(self, n):
-        '''Read a given number of $A data sentences. Returns a list of strings.'''
+    def read(self, n, after=None):
+        '''Read a given number of $A data sentences. Returns a list of strings.
+        If 'after' is given, only sentences received after that time.monotonic()
+        value are returned.'''
         pass
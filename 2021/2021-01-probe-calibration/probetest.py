@@ -1,33 +1,244 @@
 import alphabeta
 import numpy
-import scipy.optimize as spo
 import json
-import os.path
-import csv
+import os
+import sys
+import queue
+import threading
+import time
 
-class ProbeTest:
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import runningstats
+import sweepstore
+import zerosearch
+
+_identity = lambda x: x
+
+_schema = [
+    [ 'type', _identity ],
+    [ 'seq', int ],
+    [ 'baro', float ],
+    [ 'oat', float ],
+    [ 'dp0', float ],
+    [ 'dpA', float ],
+    [ 'dpB', float ],
+]
+
+# Rules for accepting a reading without asking the operator. A reading
+# is rejected if it has fewer than 'min_fraction' of the samples asked
+# for, if its sequence numbers repeat or go backwards (stale
+# sentences), if more than 'max_drop_fraction' of the sentences sent
+# while it was read were dropped, or if any channel's standard deviation
+# exceeds 'max_std' Pa (a gust or a passing truck; the points of
+# hwy101.csv are mostly 50-170 Pa). An occasional dropped sentence does
+# not bias the mean, so it is not a reason to reject on its own.
+# Rejected readings are retried up to 'max_retries' times.
+
+ACCEPT_RULES = {
+    'min_fraction': 0.9,
+    'max_drop_fraction': 0.1,
+    'max_std': {
+        'dp0': 250.0,
+        'dpA': 250.0,
+        'dpB': 250.0,
+    },
+    'max_retries': 3,
+}
+
+# How many samples to take for an unattended reading. Samples are read
+# in batches of 'batch' until the confidence interval on the mean of
+# each channel in 'target', the mean +/- 'z' standard errors, is within
+# 'target' Pa of the mean. A reading takes at least 'min_samples' and at
+# most 'max_samples', so quiet points finish early and noisy ones get
+# the samples they need.
+
+PRECISION = {
+    'batch': 10,
+    'min_samples': 30,
+    'max_samples': 500,
+    'z': 1.96,
+    'target': {
+        'dp0': 10.0,
+        'dpA': 10.0,
+        'dpB': 10.0,
+    },
+}
+
+# The functions below handle readings, as lists of $A sentences or as
+# dicts of columns, and are shared with asyncprobetest.py.
+
+def parse_sentences(lines):
+    r = {}
+    for k in _schema:
+        r[k[0]] = []
+    for l in lines:
+        a = l.split(',')
+        for i in range(0, len(_schema)):
+            r[_schema[i][0]].append(_schema[i][1](a[i]))
+    return r
+
+# The reason to reject a reading of n sentences, or None to accept it.
+
+def reject_reason(v, n, rules=ACCEPT_RULES):
+    count = len(v['seq'])
+    if count < rules['min_fraction'] * n:
+        return 'only %d of %d samples' % (count, n)
+    gaps = numpy.diff(numpy.array(v['seq']))
+    if numpy.any(gaps < 1):
+        return 'sequence break'
+    dropped = int(numpy.sum(gaps - 1))
+    if dropped > rules['max_drop_fraction'] * (count + dropped):
+        return '%d of %d sentences dropped' % (dropped, count + dropped)
+    for (k, limit) in rules['max_std'].items():
+        std = numpy.std(v[k])
+        if not std <= limit:
+            return '%s std %.1f Pa' % (k, std)
+    return None
+
+# The mean of each channel of a reading, and as '<channel>_se' the
+# standard error of that mean.
+
+def average_point(v):
+    r = {}
+    for x in ['baro', 'oat', 'dp0', 'dpA', 'dpB']:
+        r[x] = numpy.mean(v[x])
+        r[x + '_se'] = numpy.std(v[x]) / numpy.sqrt(len(v[x]))
+    return r
+
+# Append the samples of a point to the sweep <name>.sweep; see
+# lib/sweepstore.py, which can also export it as CSV.
+
+def save_point(name, mph, alpha_beta, v):
+    sweepstore.append_point(name + sweepstore.EXTENSION, mph, alpha_beta[0], alpha_beta[1], v)
+
+# The samples of one reading, with running statistics of the channels
+# in PRECISION['target']. A driver asks wanted() how many more sentences
+# to read and add()s them, until wanted() returns 0.
+
+class Reading:
+
+    def __init__(self, precision=PRECISION):
+        self.__precision = precision
+        self.__channels = sorted(precision['target'].keys())
+        self.__stats = runningstats.RunningStats(len(self.__channels))
+        self.__columns = parse_sentences([])
+        self.__requested = 0
+
+    def wanted(self):
+        p = self.__precision
+        n = self.count()
+        if n >= p['max_samples']:
+            return 0
+        if n < p['min_samples']:
+            return p['min_samples'] - n
+        target = numpy.array([p['target'][c] for c in self.__channels])
+        if numpy.all(self.half_widths() <= target):
+            return 0
+        return min(p['batch'], p['max_samples'] - n)
+
+    # Add sentences read in answer to wanted(). Raises ValueError or
+    # IndexError if any is malformed.
+
+    def add(self, lines, requested):
+        v = parse_sentences(lines)
+        self.__stats.update(numpy.column_stack([v[c] for c in self.__channels]))
+        for (k, x) in v.items():
+            self.__columns[k].extend(x)
+        self.__requested += requested
+
+    def count(self):
+        return self.__stats.count()
+
+    def requested(self):
+        return self.__requested
+
+    # The half width of the confidence interval on each channel's mean.
+
+    def half_widths(self):
+        return self.__precision['z'] * self.__stats.standard_error()
+
+    def columns(self):
+        return self.__columns
+
+    def describe(self):
+        return '%d samples, %s' % (self.count(), ', '.join(
+            '%s +/- %.1f Pa' % (c, h) for (c, h) in zip(self.__channels, self.half_widths())))
+
+# The retry loop of an unattended reading, shared by ProbeTest and
+# AsyncProbeTest so that both accept and retry alike. Readings are
+# taken as 'precision' asks and checked against 'rules', up to
+# rules['max_retries'] more times. The reading of sentences is left to
+# the driver: the generator yields the arguments (n, after) of a
+# fixture read(), the first from after 'after', is sent the lines read,
+# and returns the columns of the accepted reading, or None if every
+# attempt was rejected. read_accepted() drives it with a fixture.
+
+def accept_reading(after, rules=ACCEPT_RULES, precision=PRECISION):
+    for attempt in range(0, rules['max_retries'] + 1):
+        reading = Reading(precision)
+        try:
+            while reading.wanted() > 0:
+                n = reading.wanted()
+                reading.add((yield (n, after)), n)
+                after = None
+        except (ValueError, IndexError):
+            print('Rejected: malformed sentence')
+            continue
+        finally:
+            after = None
+        v = reading.columns()
+        reason = reject_reason(v, reading.requested(), rules)
+        if reason is None:
+            print('Accepted: %s' % (reading.describe()))
+            return v
+        print('Rejected: %s' % (reason))
+    return None
 
-    __identity = lambda x: x
-    
-    __schema = [
-        [ 'type', __identity ],
-        [ 'seq', int ],
-        [ 'baro', float ],
-        [ 'oat', float ],
-        [ 'dp0', float ],
-        [ 'dpA', float ],
-        [ 'dpB', float ],
-    ]
+def read_accepted(fixture, after, rules=ACCEPT_RULES, precision=PRECISION):
+    steps = accept_reading(after, rules, precision)
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(fixture.read(*request))
+    except StopIteration as e:
+        return e.value
+
+# The [alpha, beta] points of the standard sweep grid, alpha outer and
+# beta inner.
+
+def sweep_points(count, step):
+    return alphabeta.sweep_grid(count, step)[:, 0:2].tolist()
+
+class ProbeTest:
 
     __statefile = 'state.json'
 
+    # Samples per reading when prompting; unattended readings take as
+    # many as 'precision' asks for.
     __numsamples = 100
 
     __sweep_step = 5
     __sweep_count = 7
-    
-    def __init__(self, fixture):
+
+    # Seconds to wait after starting a move before reading, so the mount
+    # has stopped and the flow around the probe has settled.
+    __settle_time = 2.0
+
+    # With 'unattended' set, readings are accepted or rejected by
+    # 'rules' (see ACCEPT_RULES) instead of by prompting, each taking
+    # as many samples as 'precision' (see PRECISION) asks for, and
+    # sweep() writes each point from a background thread while the mount
+    # moves to the next one.
+
+    def __init__(self, fixture, unattended=False, settle_time=__settle_time,
+                 rules=ACCEPT_RULES, precision=PRECISION):
         self.__fixture = fixture
+        self.__unattended = unattended
+        self.__settle_time = settle_time
+        self.__rules = rules
+        self.__precision = precision
+        self.__moved_at = None
+        self.__position = None
         self.__zero = [0.0, 0.0]
         self.__load()
         print('self.__zero = %s' % (self.__zero))
@@ -43,104 +254,160 @@ class ProbeTest:
         with open(self.__statefile, 'w') as f: 
             json.dump({'zero': self.__zero}, f)
         
-    def find_zero(self):
-        zero = self.__zero
-        interval = 32
-        for i in range(0, 6):
-            zero = self.__estimate_zero(zero, interval)
-            interval = interval / 2.0
-        self.__zero = zero
+    # Find the az/el of zero alpha and beta, starting from the last
+    # zero found, until its standard error is below 'tolerance' degrees
+    # on both axes; see lib/zerosearch.py.
+
+    def find_zero(self, tolerance=zerosearch.DEFAULTS['tolerance']):
+        search = zerosearch.ZeroSearch(self.__zero, tolerance=tolerance)
+        while True:
+            az_el = search.next_position()
+            if az_el is None:
+                break
+            self.__moveto(az_el)
+            r = self.__read_averaged(self.__numsamples)
+            search.add(az_el, r['dpA'], r['dpB'], r['dpA_se'], r['dpB_se'])
+        e = search.estimate()
+        if e is None:
+            raise RuntimeError('no zero found in %d readings' % (search.count()))
+        (self.__zero, se) = e
+        print('zero = %s +/- %s after %d readings' % (self.__zero, se, search.count()))
         self.__save()
 
-    def sweep(self, name, mph):
+    # Sweep the given [alpha, beta] points in order, by default the
+    # standard grid in nested-loop order; sweepplan.plan() gives a
+    # faster order.
+
+    def sweep(self, name, mph, points=None):
         name = str(name)
         mph = int(mph)
-        for ai in range(-self.__sweep_count, self.__sweep_count + 1):
-            for bi in range(-self.__sweep_count, self.__sweep_count + 1):
-                alpha_beta = [
-                    ai * self.__sweep_step,
-                    bi * self.__sweep_step,
-                ]
+        if points is None:
+            points = sweep_points(self.__sweep_count, self.__sweep_step)
+        if not self.__unattended:
+            for alpha_beta in points:
                 self.acquire_point(name, mph, alpha_beta)
+            return []
+        return self.__sweep_unattended(name, mph, points)
+
+    # Acquire the points in order, starting the move to each point as
+    # soon as the previous one has been read and checked, and handing
+    # accepted points to the writer thread, so writing overlaps the move
+    # and settle time. Returns the points that were rejected after all
+    # retries, which are not written.
+
+    def __sweep_unattended(self, name, mph, points):
+        start = time.monotonic()
+        failed = []
+        self.__start_writer()
+        try:
+            if len(points) > 0:
+                self.__moveto(self.__az_el(points[0]))
+            for i in range(0, len(points)):
+                alpha_beta = points[i]
+                print('Acquiring: \"%s\" (%s mph), alpha_beta=%s' % (name, mph, alpha_beta))
+                v = self.__read_accepted()
+                if i + 1 < len(points):
+                    self.__moveto(self.__az_el(points[i + 1]))
+                if v is None:
+                    print('Giving up on alpha_beta=%s' % (alpha_beta))
+                    failed.append(alpha_beta)
+                    continue
+                self.__queue.put((name, mph, alpha_beta, v))
+        finally:
+            self.__stop_writer()
+        print('Swept %d points in %.1f s, %d rejected: %s' % (
+            len(points), time.monotonic() - start, len(failed), failed))
+        return failed
 
     def acquire_point(self, name, mph, alpha_beta):
         while True:
-            az_el = alphabeta.alpha_beta_to_az_el(alpha_beta)
-            az_el = [
-                az_el[0] + self.__zero[0],
-                az_el[1] + self.__zero[1],
-            ]
+            az_el = self.__az_el(alpha_beta)
             print('Acquiring: \"%s\" (%s mph), alpha_beta=%s az_el=%s' % (name, mph, alpha_beta, az_el))
-            self.__fixture.moveto(az_el)
-            lines = self.__fixture.read(self.__numsamples)
+            self.__moveto(az_el)
+            if self.__unattended:
+                v = self.__read_accepted()
+                if v is None:
+                    continue
+                save_point(name, mph, alpha_beta, v)
+                return
+            lines = self.__fixture.read(self.__numsamples, time.monotonic())
             print('Acquired %s lines, save (y)?' % (len(lines)))
             if input().strip().lower() == 'y':
-                v = self.__csv_to_dict(lines)
-                v['alpha'] = numpy.repeat(alpha_beta[0], len(v['baro']))
-                v['beta'] = numpy.repeat(alpha_beta[1], len(v['baro']))
-                v['mph'] = numpy.repeat(mph, len(v['baro']))        
-                self.__save_csv(name, v)
+                v = parse_sentences(lines)
+                save_point(name, mph, alpha_beta, v)
                 return
 
-    def __save_csv(self, filename, column_dict):
-        n = len(column_dict['baro'])
-        full_filename = filename + '.csv'
-        exists = os.path.isfile(full_filename)
-        with open(full_filename, 'a+') as f:
-            fieldnames = ['mph', 'alpha', 'beta', 'seq', 'baro', 'oat', 'dp0', 'dpA', 'dpB']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not exists: writer.writeheader()
-            for i in range(0, n):
-                row = {}
-                for k in fieldnames: row[k] = str(column_dict[k][i])
-                writer.writerow(row)
-        
-    def __estimate_zero(self, zero, interval):
-        zero = self.__estimate_zero_az(zero, interval)
-        zero = self.__estimate_zero_el(zero, interval)
-        return zero
-
-    def __estimate_zero_az(self, zero, interval):
-        xl = [zero[0] - interval, zero[1]]
-        xr = [zero[0] + interval, zero[1]]
-        self.__fixture.moveto(xl)
-        yl = self.__read_averaged(self.__numsamples)
-        self.__fixture.moveto(xr)
-        yr = self.__read_averaged(self.__numsamples)
-        return [self.__line_root(xl[0], yl['dpB'], xr[0], yr['dpB']), zero[1]]
-
-    def __estimate_zero_el(self, zero, interval):
-        xd = [zero[0], zero[1] - interval]
-        xu = [zero[0], zero[1] + interval]
-        self.__fixture.moveto(xd)
-        yd = self.__read_averaged(self.__numsamples)
-        self.__fixture.moveto(xu)
-        yu = self.__read_averaged(self.__numsamples)
-        return [zero[0], self.__line_root(xd[1], yd['dpA'], xu[1], yu['dpA'])]
-        
+    def __az_el(self, alpha_beta):
+        az_el = alphabeta.alpha_beta_to_az_el(alpha_beta)
+        return [
+            az_el[0] + self.__zero[0],
+            az_el[1] + self.__zero[1],
+        ]
+
+    def __moveto(self, az_el):
+        self.__fixture.moveto(az_el)
+        self.__position = az_el
+        self.__moved_at = time.monotonic()
+
+    # Wait out the rest of the settle time of the last move, if any.
+    # Returns the time.monotonic() from which readings are good, or None
+    # if there was no move to wait for.
+
+    def __settle(self):
+        if self.__moved_at is None:
+            return None
+        settled_at = self.__moved_at + self.__settle_time
+        remaining = settled_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        self.__moved_at = None
+        return settled_at
+
+    # Read samples once the mount has settled, as many as the precision
+    # asks for, retrying until they pass the accept rules. Returns the
+    # samples as a dict of columns, or None if every attempt was
+    # rejected.
+
+    def __read_accepted(self):
+        return read_accepted(self.__fixture, self.__settle(), self.__rules, self.__precision)
+
+    def __start_writer(self):
+        self.__queue = queue.Queue()
+        self.__writer_error = None
+        self.__writer = threading.Thread(target=self.__write_loop, daemon=True)
+        self.__writer.start()
+
+    def __write_loop(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
+            if self.__writer_error is not None:
+                continue
+            try:
+                save_point(*item)
+            except Exception as e:
+                self.__writer_error = e
+
+    def __stop_writer(self):
+        self.__queue.put(None)
+        self.__writer.join()
+        if self.__writer_error is not None:
+            raise self.__writer_error
+
     def __read_averaged(self, n):
+        if self.__unattended:
+            v = self.__read_accepted()
+            if v is None:
+                raise RuntimeError('no acceptable reading at %s' % (self.__position))
+            return average_point(v)
+        self.__settle()
         while True:
             print('Read averaged?')
             if input().strip().lower() == 'y':
                 break
         while True:
-            v = self.__csv_to_dict(self.__fixture.read(n))
-            r = {}
-            for x in ['baro', 'oat', 'dp0', 'dpA', 'dpB']:
-                r[x] = numpy.mean(v[x])
+            r = average_point(parse_sentences(self.__fixture.read(n, time.monotonic())))
             print('Accept and continue?')
             if input().strip().lower() == 'y':            
                 return r
-
-    def __csv_to_dict(self, lines):
-        r = {}
-        for k in self.__schema:
-            r[k[0]] = []
-        for l in lines:
-            a = l.split(',')
-            for i in range(0, len(self.__schema)):
-                r[self.__schema[i][0]].append(self.__schema[i][1](a[i]))
-        return r
-
-    def __line_root(self, x0, y0, x1, y1):
-        return x0 + (0.0 - y0) / (y1 - y0) * (x1 - x0)
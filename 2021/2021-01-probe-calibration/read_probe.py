@@ -1,13 +1,23 @@
 #!/usr/bin/python
 
+# Print the probe's sentences, all of them or those of one kind:
+#
+#     ./read_probe.py [prefix [host [port]]]
+#
+# with the probe at host:port (default 192.168.4.1:80), for instance a
+# bench/replayserver.py on 127.0.0.1 8080.
+
 import socket
 import sys
 
 alpha_total = 0.0
 beta_total = 0.0
 
+host = sys.argv[2] if len(sys.argv) > 2 else '192.168.4.1'
+port = int(sys.argv[3]) if len(sys.argv) > 3 else 80
+
 s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-s.connect(('192.168.4.1', 80))
+s.connect((host, port))
 f = s.makefile()
 
 def match(prefix):
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+
+# Run ProbeTest's zeroing and an unattended sweep end to end against the
+# simulated probe and mount of mockfixture.py, as fast as they will go:
+#
+#     ./simulate.py [mph [zero_az zero_el]] [--drop FRACTION] [--noise PA] [--rate HZ]
+#
+# --drop loses that fraction of the probe's sentences, as a lossy link
+# does, --noise sets the standard deviation of the noise on dp0, dpA
+# and dpB, and --rate the sentences per second. Both the clean run and
+#
+#     ./simulate.py --drop 0.02
+#
+# should pass before changing ProbeTest or its accept rules.
+#
+# The run is made in a temporary directory, so it leaves no state.json
+# or sweep behind. It reports how long it took, how long it would have
+# taken on the real mount, how far the zero found is from the simulated
+# one, and how far the swept means are from the model, and exits with
+# status 1 if the zero is off by more than 'zero_tolerance' degrees or
+# any point was rejected.
+
+import alphabeta
+import argparse
+import json
+import mockfixture
+import numpy
+import os
+import probetest
+import sweepplan
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import sweepstore
+
+zero_tolerance = 0.25
+
+def run(mph, zero, drop=0.0, noise=None, rate=50.0):
+    fixture = mockfixture.MockFixture(
+        mph=mph, zero=zero, seed=1, drop=drop, rate=rate,
+        noise={} if noise is None else dict((c, noise) for c in ['dp0', 'dpA', 'dpB']))
+    start = time.monotonic()
+    with tempfile.TemporaryDirectory() as d:
+        cwd = os.getcwd()
+        os.chdir(d)
+        try:
+            t = probetest.ProbeTest(fixture, unattended=True, settle_time=0)
+            t.find_zero()
+            with open('state.json') as f:
+                found = numpy.array(json.load(f)['zero'])
+            points = sweepplan.plan(probetest.sweep_points(7, 5), zero=found)['points']
+            failed = t.sweep('simulated', mph, points)
+            p = sweepstore.read_points('simulated' + sweepstore.EXTENSION)
+        finally:
+            os.chdir(cwd)
+    wall = time.monotonic() - start
+
+    # The mean of each point against the model at the true position.
+    keys = numpy.column_stack([p['alpha'], p['beta']])
+    (alpha_beta, inverse) = numpy.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    az_el = alphabeta.alpha_beta_to_az_el(alpha_beta) + found
+    model = mockfixture.probe_pressures(az_el, mph, zero)
+    errors = {}
+    for c in ['dp0', 'dpA', 'dpB']:
+        means = numpy.bincount(inverse, p[c]) / numpy.bincount(inverse)
+        errors[c] = numpy.sqrt(numpy.mean((means - model[c]) ** 2))
+
+    zero_error = found - numpy.array(zero)
+    print('')
+    print('Wall time %.1f s, simulated mount time %.1f s' % (wall, fixture.elapsed()))
+    print('Zero found %s, error %s degrees' % (found.tolist(), zero_error.tolist()))
+    print('%d points, %d samples, %d rejected' % (len(alpha_beta), len(keys), len(failed)))
+    print('RMS error of point means: %s' % (
+        ', '.join('%s %.2f Pa' % (c, e) for (c, e) in errors.items())))
+    return numpy.max(numpy.abs(zero_error)) <= zero_tolerance and len(failed) == 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Zero and sweep a simulated probe and mount.')
+    parser.add_argument('mph', type=int, nargs='?', default=60)
+    parser.add_argument('zero', type=float, nargs='*', default=[2.0, -1.5], metavar='zero_az zero_el')
+    parser.add_argument('--drop', type=float, default=0.0, help='fraction of sentences to lose')
+    parser.add_argument('--noise', type=float, metavar='PA', help='noise on dp0, dpA and dpB')
+    parser.add_argument('--rate', type=float, default=50.0, help='sentences per second')
+    args = parser.parse_args()
+    if len(args.zero) != 2:
+        parser.error('give both zero_az and zero_el')
+    sys.exit(0 if run(args.mph, args.zero, args.drop, args.noise, args.rate) else 1)
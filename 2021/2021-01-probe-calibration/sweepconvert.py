@@ -0,0 +1,27 @@
+#!/usr/bin/python
+
+# Convert between the .sweep files ProbeTest writes and the CSV layout
+# of hwy101.csv:
+#
+#     ./sweepconvert.py name.sweep [name.csv]
+#     ./sweepconvert.py name.csv [name.sweep]
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import sweepstore
+
+source = sys.argv[1]
+(base, extension) = os.path.splitext(source)
+
+if extension == sweepstore.EXTENSION:
+    target = sys.argv[2] if len(sys.argv) > 2 else base + '.csv'
+    sweepstore.export_csv(source, target)
+else:
+    target = sys.argv[2] if len(sys.argv) > 2 else base + sweepstore.EXTENSION
+    if os.path.exists(target):
+        sys.exit('%s already exists' % (target))
+    sweepstore.import_csv(source, target)
+
+print('wrote ' + target)
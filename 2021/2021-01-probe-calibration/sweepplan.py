@@ -0,0 +1,148 @@
+import alphabeta
+import numpy
+
+# Ordering of sweep points to cut the time the mount spends moving.
+#
+# Both motors move at once, each at its own speed, so a move takes as
+# long as the slower axis needs:
+#
+#     time = max(|d az| / az speed, |d el| / el speed)
+#
+# Plain nested-loop order ends every row with a slew across the whole
+# range; a serpentine order sweeps alternate rows in opposite
+# directions instead. For sparse or irregular point sets, a nearest
+# neighbour tour improved by 2-opt does better. plan() tries both and
+# keeps the faster.
+#
+# Speeds are in degrees per second. The defaults are for the
+# ExperimentalFixture mount: speed setting 50 on the Dynamixel motors,
+# at 0.111 rpm per unit, is about 33 degrees per second.
+
+DEFAULT_SPEEDS = (33.3, 33.3)
+
+LIMIT = 45.0
+
+########################################################################
+
+# The az/el the mount goes to for each [alpha, beta] point, given the
+# zero, clipped to the mount's limits as the fixtures do.
+
+def mount_positions(alpha_beta, zero=(0.0, 0.0), limit=LIMIT):
+    az_el = alphabeta.alpha_beta_to_az_el(numpy.asarray(alpha_beta, dtype=numpy.float64).reshape(-1, 2))
+    return numpy.clip(az_el + numpy.asarray(zero), -limit, limit)
+
+def _times(a, b, speeds):
+    d = numpy.abs(a - b) / numpy.asarray(speeds)
+    return numpy.max(d, axis=-1)
+
+# Total travel time visiting the mount positions az_el in order,
+# starting from 'start'.
+
+def travel_time(az_el, start=(0.0, 0.0), speeds=DEFAULT_SPEEDS):
+    path = numpy.vstack([numpy.asarray(start, dtype=numpy.float64), az_el])
+    return float(numpy.sum(_times(path[1:], path[:-1], speeds)))
+
+########################################################################
+
+# Serpentine order: rows of equal el (or of equal az, whichever is
+# faster), alternate rows reversed.
+
+def _serpentine(az_el, start, speeds):
+    best = None
+    for (row, column) in [(1, 0), (0, 1)]:
+        keys = numpy.round(az_el[:, row], 6)
+        rows = numpy.unique(keys)
+        # Start from the end of the rows nearer the start position.
+        if abs(rows[-1] - start[row]) < abs(rows[0] - start[row]):
+            rows = rows[::-1]
+        for flip in [False, True]:
+            order = []
+            for (i, r) in enumerate(rows):
+                members = numpy.flatnonzero(keys == r)
+                members = members[numpy.argsort(az_el[members, column], kind='stable')]
+                if (i % 2 == 1) != flip:
+                    members = members[::-1]
+                order.extend(members.tolist())
+            order = numpy.array(order, dtype=int)
+            t = travel_time(az_el[order], start, speeds)
+            if best is None or t < best[0]:
+                best = (t, order)
+    return best[1]
+
+# Nearest neighbour tour from the start position.
+
+def _nearest_neighbour(az_el, start, speeds):
+    n = len(az_el)
+    visited = numpy.zeros(n, dtype=bool)
+    order = numpy.zeros(n, dtype=int)
+    here = numpy.asarray(start, dtype=numpy.float64)
+    for k in range(0, n):
+        t = _times(az_el, here, speeds)
+        t[visited] = numpy.inf
+        i = int(numpy.argmin(t))
+        order[k] = i
+        visited[i] = True
+        here = az_el[i]
+    return order
+
+# Improve an open tour, whose first stop is fixed at the start position,
+# by reversing segments while that shortens it.
+
+def _two_opt(az_el, order, start, speeds, max_passes=50):
+    path = numpy.vstack([numpy.asarray(start, dtype=numpy.float64), az_el[order]])
+    index = numpy.concatenate(([-1], order))
+    n = len(path)
+    for p in range(0, max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            j = numpy.arange(i + 1, n)
+            before = _times(path[i - 1], path[i], speeds)
+            removed = before + _times(path[j], path[numpy.minimum(j + 1, n - 1)], speeds) * (j < n - 1)
+            added = _times(path[i - 1], path[j], speeds) + \
+                _times(path[i], path[numpy.minimum(j + 1, n - 1)], speeds) * (j < n - 1)
+            gain = removed - added
+            k = int(numpy.argmax(gain))
+            if gain[k] > 1e-9:
+                jk = j[k]
+                path[i:jk + 1] = path[i:jk + 1][::-1].copy()
+                index[i:jk + 1] = index[i:jk + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return index[1:]
+
+########################################################################
+
+# Plan the order of a sweep's [alpha, beta] points. 'method' is
+# 'serpentine', 'tour' (nearest neighbour plus 2-opt), 'given' (the
+# order as passed) or 'auto', the fastest of the first two. Returns a
+# dict with:
+#
+#     points      -- the [alpha, beta] points in the planned order
+#     order       -- the indices of those points in the input
+#     time        -- predicted travel time in seconds
+#     given_time  -- predicted travel time in the order as passed
+
+def plan(alpha_beta, method='auto', zero=(0.0, 0.0), start=None, speeds=DEFAULT_SPEEDS, limit=LIMIT):
+    alpha_beta = numpy.asarray(alpha_beta, dtype=numpy.float64).reshape(-1, 2)
+    az_el = mount_positions(alpha_beta, zero, limit)
+    if start is None:
+        start = numpy.asarray(zero, dtype=numpy.float64)
+    given = numpy.arange(len(az_el))
+    candidates = []
+    if len(az_el) == 0 or method == 'given':
+        candidates.append(given)
+    if len(az_el) > 0 and method in ['serpentine', 'auto']:
+        candidates.append(_serpentine(az_el, start, speeds))
+    if len(az_el) > 0 and method in ['tour', 'auto']:
+        candidates.append(_two_opt(az_el, _nearest_neighbour(az_el, start, speeds), start, speeds))
+    if len(candidates) == 0:
+        raise ValueError('unknown planning method: %s' % method)
+    times = [travel_time(az_el[o], start, speeds) for o in candidates]
+    best = candidates[int(numpy.argmin(times))]
+    return {
+        'points': alpha_beta[best].tolist(),
+        'order': best,
+        'time': min(times),
+        'given_time': travel_time(az_el, start, speeds),
+    }
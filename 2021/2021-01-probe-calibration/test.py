@@ -10,8 +10,14 @@ import probetest
 name = sys.argv[1]
 mph = int(sys.argv[2])
 alpha_beta = [int(sys.argv[3]), int(sys.argv[4])]
+# The probe's address, if not the default 192.168.4.1:80.
+address = {}
+if len(sys.argv) > 5:
+    address['host'] = sys.argv[5]
+if len(sys.argv) > 6:
+    address['port'] = int(sys.argv[6])
 
 print('Acquiring "%s", %d mph, alpha_beta = %s' % (name, mph, alpha_beta))
 
-t = probetest.ProbeTest(experimentalfixture.ExperimentalFixture())
+t = probetest.ProbeTest(experimentalfixture.ExperimentalFixture(**address))
 t.acquire_point(name, mph, alpha_beta)
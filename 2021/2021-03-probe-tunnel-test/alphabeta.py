@@ -1,5 +1,5 @@
-import scipy.optimize
-import math
+import functools
+import numpy
 
 def alpha_beta_to_az_el(alpha_beta):
     '''
@@ -13,29 +13,56 @@ def alpha_beta_to_az_el(alpha_beta):
     This function takes the desired values of (a, b), and returns a tuple
     (u, v) of the az-el angles to which the mount should be slewed to achieve
     them.
+
+    The math works out such that the altitude angle 'v' is equal to the
+    angle of attack, alpha, and beta is given by
+
+        cos(b) = cos(u) cos(v) / sqrt(1 - cos(u)^2 sin(v)^2)
+
+    which can be solved for u in closed form:
+
+        tan(u) = cos(v) tan(b)
+
+    Takes either a single [alpha, beta] pair in degrees, returning an
+    [az, el] pair, or an array of shape (..., 2), returning an array of
+    the same shape.
+    '''
+    alpha_beta = numpy.asarray(alpha_beta, dtype=numpy.float64)
+    a = numpy.radians(alpha_beta[..., 0])
+    b = numpy.radians(alpha_beta[..., 1])
+    v = a
+    u = numpy.arctan2(numpy.cos(v) * numpy.sin(b), numpy.cos(b))
+    return _result(alpha_beta, u, v)
+
+def az_el_to_alpha_beta(az_el):
+    '''
+    The inverse of alpha_beta_to_az_el(): the [alpha, beta] in degrees
+    seen by the probe when the mount is at a given [az, el], from
+
+        tan(b) = tan(u) / cos(v)
     '''
+    az_el = numpy.asarray(az_el, dtype=numpy.float64)
+    u = numpy.radians(az_el[..., 0])
+    v = numpy.radians(az_el[..., 1])
+    b = numpy.arctan2(numpy.sin(u), numpy.cos(u) * numpy.cos(v))
+    return _result(az_el, v, b)
 
-    alpha_beta_radians = [
-        math.fabs(math.radians(alpha_beta[0])),
-        math.fabs(math.radians(alpha_beta[1])),
-    ]
-    
-    # The math works out such that, for the expected ranges, the
-    # altitude angle 'v' is equal to the angle of attack, alpha
-    v = alpha_beta_radians[0]
-
-    # Next, we define the function that computes beta given (u, v),
-    # where 'v' is already known.
-    beta = lambda u: math.acos((math.cos(u) * math.cos(v)) / math.sqrt(1 + math.cos(u) ** 2 * (math.cos(v) ** 2 - 1)))
-
-    # We now use root-finding to determine the azimuth angle 'u' that
-    # gives us the value of beta that we want.
-    results = scipy.optimize.root_scalar(
-        lambda u: beta(u) - alpha_beta_radians[1],
-        x0 = alpha_beta_radians[1],
-        x1 = alpha_beta_radians[1] + 0.1)
-    if not results.converged: raise 'Not converged: %s' % results
-    return [
-        math.copysign(math.degrees(results.root), alpha_beta[1]),
-        math.copysign(math.degrees(v), alpha_beta[0]),
-    ]
+def _result(like, x, y):
+    r = numpy.stack([numpy.degrees(x), numpy.degrees(y)], axis=-1)
+    if like.ndim == 1:
+        return r.tolist()
+    return r
+
+@functools.lru_cache(maxsize=None)
+def sweep_grid(count, step):
+    '''
+    The sweep grid of (2 * count + 1)^2 points with alpha and beta from
+    -count * step to count * step degrees, alpha outer and beta inner,
+    as a read-only array with one row [alpha, beta, az, el] per point.
+    Computed once per (count, step).
+    '''
+    i = numpy.arange(-count, count + 1) * step
+    alpha_beta = numpy.stack(numpy.meshgrid(i, i, indexing='ij'), axis=-1).reshape(-1, 2)
+    grid = numpy.concatenate([alpha_beta, alpha_beta_to_az_el(alpha_beta)], axis=-1)
+    grid.setflags(write=False)
+    return grid
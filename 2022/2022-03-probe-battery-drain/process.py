@@ -1,18 +1,17 @@
 #!/usr/bin/python
 
+import os
+import sys
 import matplotlib.pyplot as plt
 
-import csv
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib'))
+import cache
 
-lines = [
-    [float(line[0]) / 3600.0, float(line[3]) / 1000.0]
-    for line in csv.reader(open('./battery_draindown.log'))
-]
+log = cache.read_columns('./battery_draindown.log', ['time', 'voltage'], usecols=[0, 3])
 
-t0 = lines[0][0]
-
-t = [x[0] - t0 for x in lines]
-v = [x[1] for x in lines]
+t = log['time'] / 3600.0
+t = t - t[0]
+v = log['voltage'] / 1000.0
 
 fig = plt.figure()
 ax = fig.add_subplot(111)
@@ -0,0 +1,303 @@
+#!/usr/bin/python
+
+# Benchmarks of the processing hot paths on the data in this repository.
+#
+#     ./bench/bench.py [-r repeat] [-o results.json] [--compare old.json] [case ...]
+#
+# runs every case, or those named, and prints and saves the results as
+# JSON, by default to bench/results/<host>-<date>-<time>.json. With
+# --compare, each case's throughput is also given as a ratio to that of
+# an earlier results file. See bench/README.md.
+
+import argparse
+import ast
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+sys.path.append(os.path.join(ROOT, 'lib'))
+import cache
+import calibration
+import filters
+import probesolver
+import probetable
+import telemetry
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Each case is timed over at least this many seconds per repeat.
+MIN_TIME = 0.2
+
+########################################################################
+
+def path(*parts):
+    return os.path.normpath(os.path.join(ROOT, *parts))
+
+# The processing scripts run their analysis when loaded, so only their
+# imports, functions, classes and constant assignments are executed.
+# Returns the script's namespace as a dict.
+
+def load_script(*parts):
+    filename = path(*parts)
+    with open(filename) as f:
+        tree = ast.parse(f.read(), filename)
+    tree.body = [
+        n for n in tree.body
+        if isinstance(n, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef))
+        or (isinstance(n, ast.Assign) and not isinstance(n.value, ast.Call))
+    ]
+    directory = os.path.dirname(filename)
+    if directory not in sys.path:
+        sys.path.append(directory)
+    namespace = {'__file__': filename, '__name__': os.path.basename(filename)}
+    exec(compile(tree, filename, 'exec'), namespace)
+    return namespace
+
+########################################################################
+
+# The cases. Each takes no arguments, does its setup, and returns a
+# tuple (function, count, unit): the function is what is timed, and
+# 'count' is the number of 'unit's it processes per call.
+
+TELEMETRY_LOG = ('2019', '2019-04-28-01', 'telemetry-log.csv')
+AIRDATA_LOG = ('2019', '2019-12-31-01', 'airdata_20191231_191739.csv')
+HWY101 = ('2021', '2021-01-probe-calibration', 'hwy101.csv')
+
+PRESSURE_COLUMNS = ['time', 'rssi', 'seq', 'baro', 'temp', 'dp0', 'dpa', 'dpb']
+
+def _rows(d):
+    return len(next(iter(d.values())))
+
+def csv_telemetry_log():
+    filename = path(*TELEMETRY_LOG)
+    f = lambda: telemetry.read_columns(filename, PRESSURE_COLUMNS)
+    return f, _rows(f()), 'rows'
+
+def csv_airdata():
+    filename = path(*AIRDATA_LOG)
+    f = lambda: telemetry.read_columns(filename, PRESSURE_COLUMNS)
+    return f, _rows(f()), 'rows'
+
+def csv_hwy101():
+    filename = path(*HWY101)
+    f = lambda: telemetry.read_columns(filename, None, header=True)
+    return f, _rows(f()), 'rows'
+
+# A cached read, once the cache has been filled.
+
+def cached_telemetry_log():
+    filename = path(*TELEMETRY_LOG)
+    f = lambda: cache.read_columns(filename, PRESSURE_COLUMNS)
+    return f, _rows(f()), 'rows'
+
+# The smoothing of 2019-06-01-01/process.py, on the pressure log.
+
+def movingaverage_dataset():
+    d = telemetry.read_columns(path(*TELEMETRY_LOG), PRESSURE_COLUMNS)
+    f = lambda: filters.moving_average_dataset(d, 20)
+    return f, _rows(d), 'rows'
+
+# generic_probe_raw2data(), one scipy root find per sample, over every
+# 10th point of the grid of plot_calibration(), as a full grid takes
+# several seconds.
+
+def _calibration_grid():
+    ra, rb = np.meshgrid(probetable.default_axis(), probetable.default_axis())
+    return ra.ravel(), rb.ravel()
+
+def raw2data_scipy():
+    s = load_script('2020', '2020-03-probe-comparisons', 'process.py')
+    (ra, rb) = _calibration_grid()
+    ra = ra[::10]
+    rb = rb[::10]
+    def f():
+        for i in range(0, len(ra)):
+            s['v2_probe_raw2data'](1.0, ra[i], rb[i])
+    return f, len(ra), 'solves'
+
+# The same solves for the whole grid by probesolver.py.
+
+def raw2data_newton():
+    (ra, rb) = _calibration_grid()
+    f = lambda: probesolver.v2_probe_raw2data(1.0, ra, rb)
+    return f, len(ra), 'solves'
+
+# makeplot.py's reduction of hwy101.csv to one row per sweep point.
+
+def _hwy101_ratios():
+    d = calibration.read_sweep(path(*HWY101))
+    calibration.add_sweep_ratios(d)
+    return d
+
+def reduce_average():
+    s = load_script('2021', '2021-01-probe-calibration', 'makeplot.py')
+    d = _hwy101_ratios()
+    f = lambda: s['reduce_average'](d, ['dp0_q', 'dpA_q', 'dpB_q'])
+    return f, _rows(d), 'rows'
+
+# The numbers behind makeplot.py's plot_scaling() for each channel: the
+# error curve over the plotted scales, and the best scale. The plotting
+# itself is left out.
+
+def compute_error():
+    s = load_script('2021', '2021-01-probe-calibration', 'makeplot.py')
+    r = s['reduce_average'](_hwy101_ratios(), ['dp0_q', 'dpA_q', 'dpB_q'])
+    s['add_theoreticals'](r)
+    s['add_ratios'](r)
+    scalings = np.arange(0.1, 1.9, 0.05)
+    channels = ['dp0_q', 'dpA_q', 'dpB_q']
+    def f():
+        for v in channels:
+            s['compute_error'](r, v, scalings)
+            s['fit_scaling'](r, v)
+    return f, len(channels) * len(scalings) * len(r['alpha']), 'points'
+
+# alpha_beta_to_az_el() over the standard 15 x 15 sweep grid.
+
+def alpha_beta_to_az_el():
+    s = load_script('2021', '2021-01-probe-calibration', 'probetest.py')
+    grid = np.array(s['sweep_points'](7, 5))
+    f = lambda: s['alphabeta'].alpha_beta_to_az_el(grid)
+    return f, len(grid), 'solves'
+
+CASES = [
+    csv_telemetry_log,
+    csv_airdata,
+    csv_hwy101,
+    cached_telemetry_log,
+    movingaverage_dataset,
+    raw2data_scipy,
+    raw2data_newton,
+    reduce_average,
+    compute_error,
+    alpha_beta_to_az_el,
+]
+
+########################################################################
+
+# Time one case: the best and median seconds per call over 'repeat'
+# repeats, each of enough calls to take MIN_TIME, and the peak memory
+# traced during one more call.
+
+def measure(case, repeat):
+    (f, count, unit) = case()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(0, number):
+            f()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            break
+        number = number * 2
+    times = [elapsed / number]
+    for r in range(1, repeat):
+        start = time.perf_counter()
+        for i in range(0, number):
+            f()
+        times.append((time.perf_counter() - start) / number)
+
+    tracemalloc.start()
+    try:
+        f()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    best = min(times)
+    return {
+        'count': count,
+        'unit': unit,
+        'calls': number * repeat,
+        'best_seconds': best,
+        'median_seconds': float(np.median(times)),
+        'rate': count / best,
+        'peak_bytes': peak,
+    }
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(cases, repeat):
+    results = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'commit': _commit(),
+        'repeat': repeat,
+        'cases': {},
+    }
+    for case in cases:
+        r = measure(case, repeat)
+        results['cases'][case.__name__] = r
+        print('%-24s %12.0f %s/s %10.3f ms %8.1f MB peak' % (
+            case.__name__, r['rate'], r['unit'], r['best_seconds'] * 1000.0, r['peak_bytes'] / 1e6))
+    return results
+
+def compare(results, old):
+    print('')
+    print('Throughput against %s (%s):' % (old.get('date'), old.get('commit')))
+    for (name, r) in results['cases'].items():
+        o = old['cases'].get(name)
+        if o is None:
+            print('%-24s %12s' % (name, 'new'))
+            continue
+        print('%-24s %11.2fx  peak memory %.2fx' % (
+            name, r['rate'] / o['rate'],
+            r['peak_bytes'] / o['peak_bytes'] if o['peak_bytes'] > 0 else math.nan))
+
+########################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the processing hot paths.')
+    parser.add_argument('cases', nargs='*', help='cases to run (default: all)')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='results file')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('-l', '--list', action='store_true', help='list the cases')
+    args = parser.parse_args()
+
+    if args.list:
+        for case in CASES:
+            print(case.__name__)
+        return
+
+    names = dict((case.__name__, case) for case in CASES)
+    unknown = [c for c in args.cases if c not in names]
+    if len(unknown) > 0:
+        parser.error('unknown cases: %s' % (', '.join(unknown)))
+    cases = [names[c] for c in args.cases] if len(args.cases) > 0 else CASES
+
+    results = run(cases, args.repeat)
+
+    output = args.output
+    if output is None:
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        output = os.path.join(RESULTS_DIR, '%s-%s.json' % (
+            platform.node() or 'host', datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results written to %s' % (output))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
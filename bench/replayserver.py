@@ -0,0 +1,260 @@
+#!/usr/bin/python
+
+# A local stand-in for the probe that replays a recorded log as the
+# probe's $A / $B sentences over TCP, for load-testing the readers
+# (tcpread.py, read_probe.py, ProbeStream and the fixtures) without the
+# probe:
+#
+#     ./bench/replayserver.py LOG [--port 8080] [--speed N | --max] [options]
+#
+# LOG may be
+#
+#   - a telemetry log of 'time,rssi,seq,baro,temp,dp0,dpa,dpb' rows,
+#     such as telemetry-log.csv or airdata_20191231_191739.csv, sent as
+#     '$A,seq,baro,temp,dp0,dpa,dpb',
+#   - a log of 'time,sentence' rows, such as battery_draindown.log or
+#     tcpread.py's data.csv, sent as recorded,
+#   - a sweep, as a CSV with a 'mph,alpha,beta,seq,...' header such as
+#     hwy101.csv or as a .sweep file, sent as $A sentences at --rate per
+#     second, as sweeps have no times, or
+#   - a tcpread.py capture (.cap) file.
+#
+# Sentences are sent at the pace they were recorded (--speed 1, the
+# default), N times faster (--speed N), or as fast as the reader takes
+# them (--max). The faults of a real link can be added: --jitter delays
+# each batch of sentences by up to that many seconds, --drop loses that
+# fraction of sentences, and --disconnect closes the connection after
+# that many seconds on average. A client that reconnects continues
+# where the last one left off. --loop starts the log again at its end.
+#
+# --stamp adds the server's time.time() as a last field of each
+# sentence, so a reader that logs whole lines with their arrival times,
+# such as tcpread.py --capture --text, gives the latency of each one.
+# The readers that parse sentences ignore extra fields.
+#
+# Each second, the sentences and bytes sent and how far the replay is
+# behind its schedule are reported to stderr; behind by more and more
+# means the reader cannot keep up.
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
+import capture
+import sweepstore
+import telemetry
+
+# Sentences sent per write when sending as fast as possible, and the
+# longest wait between writes otherwise.
+_BATCH = 1000
+_PERIOD = 0.01
+
+########################################################################
+
+# Read a log as an array of the times at which its sentences were
+# received, starting from zero, and a list of the sentences as bytes.
+
+def _sweep(d, rate):
+    fields = [d['seq'].astype(np.int64)] + [d[c] for c in sweepstore.COLUMNS[1:]]
+    lines = [b'$A,%d,%f,%f,%f,%f,%f' % tuple(r) for r in zip(*[f.tolist() for f in fields])]
+    return np.arange(len(lines)) / rate, lines
+
+def _first_line(filename):
+    with open(filename, 'rb') as f:
+        for line in f:
+            if len(line.strip()) > 0:
+                return line.strip()
+    return b''
+
+def read_log(filename, rate=50.0):
+    if filename.endswith(sweepstore.EXTENSION):
+        return _sweep(sweepstore.read_points(filename), rate)
+    if filename.endswith(capture.EXTENSION):
+        (times, lines) = capture.read_records(filename)
+    else:
+        first = _first_line(filename).split(b',')
+        if len(first) > 1 and first[1].startswith(b'$'):
+            times = []
+            lines = []
+            with open(filename, 'rb') as f:
+                for line in f:
+                    (t, _, sentence) = line.strip().partition(b',')
+                    if len(sentence) > 0:
+                        times.append(float(t))
+                        lines.append(sentence)
+            times = np.array(times)
+        elif b'dp0' in first:
+            return _sweep(telemetry.read_columns(filename, None, header=True), rate)
+        else:
+            cols = ['time', 'rssi', 'seq', 'baro', 'temp', 'dp0', 'dpa', 'dpb']
+            d = telemetry.read_columns(filename, cols)
+            times = d['time']
+            lines = [b'$A,%d,%f,%f,%f,%f,%f' % tuple(r) for r in zip(
+                d['seq'].astype(np.int64).tolist(), *[d[c].tolist() for c in cols[3:]])]
+    if len(lines) == 0:
+        return np.zeros(0), lines
+    # Times in a log may step back a little; the replay never does.
+    times = np.maximum.accumulate(np.asarray(times, dtype=np.float64))
+    return times - times[0], lines
+
+########################################################################
+
+class ReplayServer:
+
+    # 'speed' None sends as fast as possible.
+
+    def __init__(self, times, lines, speed=1.0, jitter=0.0, drop=0.0, disconnect=None,
+                 loop=False, stamp=False):
+        self.__times = times
+        self.__lines = lines
+        self.__speed = speed
+        self.__jitter = jitter
+        self.__drop = drop
+        self.__disconnect = disconnect
+        self.__loop = loop
+        self.__stamp = stamp
+        self.__position = 0
+        self.__server = None
+        self.__sent = 0
+        self.__bytes = 0
+        self.__behind = 0.0
+        self.__connections = 0
+        self.done = asyncio.Event()
+
+    # Start serving; with port 0, a free port is picked. Returns the
+    # port.
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.__server = await asyncio.start_server(self.__serve, host, port)
+        return self.__server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    def stats(self):
+        return {
+            'sent': self.__sent,
+            'bytes': self.__bytes,
+            'behind': self.__behind,
+            'connections': self.__connections,
+            'position': self.__position,
+        }
+
+    # Report the stats to stderr every second until cancelled.
+
+    async def report(self):
+        last = self.stats()
+        while True:
+            await asyncio.sleep(1.0)
+            s = self.stats()
+            sys.stderr.write('%d sentences/s, %d bytes/s, %.3f s behind, %d of %d sent, %d connections\n' % (
+                s['sent'] - last['sent'], s['bytes'] - last['bytes'], s['behind'],
+                s['position'], len(self.__lines), s['connections']))
+            sys.stderr.flush()
+            last = s
+
+    def __encode(self, lines):
+        if self.__drop > 0:
+            lines = [l for l in lines if random.random() >= self.__drop]
+        if self.__stamp:
+            stamp = b',%.6f' % time.time()
+            lines = [l + stamp for l in lines]
+        return b''.join(l + b'\r\n' for l in lines), len(lines)
+
+    async def __serve(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        self.__connections += 1
+        closes_at = None
+        if self.__disconnect is not None:
+            closes_at = loop.time() + random.expovariate(1.0 / self.__disconnect)
+        # The loop.time() at which the start of the log is due, so that the
+        # replay resumes from __position now.
+        start = loop.time() - self.__times[self.__position] / self.__speed \
+            if self.__speed is not None and self.__position < len(self.__lines) else loop.time()
+        try:
+            while True:
+                if self.__position >= len(self.__lines):
+                    if not self.__loop:
+                        break
+                    self.__position = 0
+                    start = loop.time()
+                now = loop.time()
+                if closes_at is not None and now >= closes_at:
+                    break
+                i = self.__position
+                if self.__speed is None:
+                    j = min(i + _BATCH, len(self.__lines))
+                else:
+                    due = (now - start) * self.__speed
+                    j = int(np.searchsorted(self.__times, due, side='right'))
+                    # How long the oldest unsent sentence has been due.
+                    self.__behind = max(0.0, due - self.__times[i]) / self.__speed if j > i else 0.0
+                if j > i:
+                    if self.__jitter > 0:
+                        await asyncio.sleep(random.uniform(0.0, self.__jitter))
+                    (data, n) = self.__encode(self.__lines[i:j])
+                    writer.write(data)
+                    await writer.drain()
+                    self.__position = j
+                    self.__sent += n
+                    self.__bytes += len(data)
+                if self.__speed is not None and self.__position < len(self.__lines):
+                    wait = start + self.__times[self.__position] / self.__speed - loop.time()
+                    await asyncio.sleep(min(max(wait, 0.0), _PERIOD))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+        if self.__position >= len(self.__lines) and not self.__loop:
+            self.done.set()
+
+########################################################################
+
+async def main(args):
+    (times, lines) = read_log(args.log, args.rate)
+    if len(lines) == 0:
+        sys.exit('%s: no sentences' % (args.log))
+    server = ReplayServer(
+        times, lines,
+        speed=None if args.max else args.speed,
+        jitter=args.jitter,
+        drop=args.drop,
+        disconnect=args.disconnect,
+        loop=args.loop,
+        stamp=args.stamp)
+    port = await server.start(args.host, args.port)
+    sys.stderr.write('Replaying %d sentences over %.1f s of %s on %s:%d\n' % (
+        len(lines), times[-1], args.log, args.host, port))
+    report = asyncio.ensure_future(server.report())
+    try:
+        await server.done.wait()
+    finally:
+        report.cancel()
+        await server.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded log as probe sentences over TCP.')
+    parser.add_argument('log')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--speed', type=float, default=1.0, help='times real time')
+    parser.add_argument('--max', action='store_true', help='send as fast as the reader takes them')
+    parser.add_argument('--rate', type=float, default=50.0, help='sentences per second of a sweep')
+    parser.add_argument('--jitter', type=float, default=0.0, help='delay each batch up to SECONDS')
+    parser.add_argument('--drop', type=float, default=0.0, help='fraction of sentences to lose')
+    parser.add_argument('--disconnect', type=float, help='close the connection after SECONDS on average')
+    parser.add_argument('--loop', action='store_true', help='start the log again at its end')
+    parser.add_argument('--stamp', action='store_true', help='add the send time to each sentence')
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,135 @@
+import math
+import numpy as np
+
+import probesolver
+
+########################################################################
+
+# Airdata computed in-process from the raw probe telemetry, as a
+# replacement for piping logs through the embedded 'telemetry_to_airdata'
+# host tool. Every function takes and returns numpy arrays, so a whole
+# log is converted in one pass.
+#
+# The inputs are the telemetry columns:
+#
+#     time  -- seconds
+#     baro  -- barometric pressure, pascals
+#     temp  -- air temperature, degrees Celsius
+#     dp0   -- (center hole) - (static), pascals
+#     dpa   -- (lower hole) - (upper hole), pascals
+#     dpb   -- (right hole) - (left hole), pascals
+#
+# and the outputs are the columns the host tool used to append:
+#
+#     alt   -- altitude above the QNH datum, meters
+#     climb -- rate of climb, meters per second
+#     q     -- dynamic pressure, pascals
+#     ias   -- indicated airspeed, meters per second
+#     tas   -- true airspeed, meters per second
+#     alpha -- angle of attack, radians
+#     beta  -- angle of yaw, radians
+#
+# Angles and q come from potential flow theory for the "v1" probe, a
+# 5-hole sphere plus a static source, which is what we flew in 2019.
+# Samples where the angles cannot be solved for (typically with no
+# airflow) have NaN alpha, beta, q and airspeeds.
+
+########################################################################
+
+# Standard atmosphere and air constants.
+
+_R = 287.058               # specific gas constant of air, J/(kg K)
+_RHO_SEA_LEVEL = 1.225     # kg/m3
+_T0 = 288.15               # K
+_LAPSE_RATE = 0.0065       # K/m
+_G = 9.80665               # m/s2
+
+# Largest differences we accept between these results and those of the
+# embedded tool for the same log and QNH, in the units of each column.
+
+TOLERANCES = {
+    'alt': 1.0,
+    'climb': 0.5,
+    'q': 0.5,
+    'ias': 0.1,
+    'tas': 0.1,
+    'alpha': math.radians(0.25),
+    'beta': math.radians(0.25),
+}
+
+########################################################################
+
+def pressure_altitude(baro, qnh):
+    return _T0 / _LAPSE_RATE * (1.0 - (baro / qnh) ** (_R * _LAPSE_RATE / _G))
+
+def air_density(baro, temp):
+    return baro / (_R * (temp + 273.15))
+
+# Rate of climb over the preceding 'span' seconds. Differencing over a
+# fixed time span rather than adjacent samples keeps the result stable
+# when the sample rate varies or timestamps arrive in batches.
+
+def climb_rate(time, alt, span=1.0):
+    return (alt - np.interp(time - span, time, alt)) / span
+
+########################################################################
+
+# Compute all airdata columns from raw telemetry columns. 'qnh' is the
+# barometer setting in pascals for this particular log.
+
+def compute(time, baro, temp, dp0, dpa, dpb, qnh):
+    time = np.asarray(time, dtype=np.float64)
+    baro = np.asarray(baro, dtype=np.float64)
+    temp = np.asarray(temp, dtype=np.float64)
+    dp0 = np.asarray(dp0, dtype=np.float64)
+
+    alpha, beta, q = probesolver.v1_probe_raw2data(dp0, dpa, dpb, warm_start=True)
+
+    with np.errstate(invalid='ignore'):
+        # Negative q (suction on the center hole) has no airspeed.
+        positive_q = np.maximum(q, 0.0)
+        ias = np.sqrt(2.0 * positive_q / _RHO_SEA_LEVEL)
+        tas = np.sqrt(2.0 * positive_q / air_density(baro, temp))
+
+    alt = pressure_altitude(baro, qnh)
+
+    return {
+        'alt': alt,
+        'climb': climb_rate(time, alt),
+        'q': q,
+        'ias': ias,
+        'tas': tas,
+        'alpha': alpha,
+        'beta': beta,
+    }
+
+# Same as compute(), taking the inputs from a dict of columns as
+# returned by telemetry.read_columns().
+
+def compute_dataset(dataset, qnh):
+    return compute(
+        dataset['time'],
+        dataset['baro'],
+        dataset['temp'],
+        dataset['dp0'],
+        dataset['dpa'],
+        dataset['dpb'],
+        qnh)
+
+########################################################################
+
+# Compare computed airdata with a reference, such as the output of the
+# embedded tool for the same log. Returns a dict mapping each column to
+# a tuple (maximum absolute difference, within tolerance). Samples where
+# either side is NaN are ignored.
+
+def compare(computed, reference, tolerances=TOLERANCES):
+    result = {}
+    for (k, tolerance) in tolerances.items():
+        if k not in computed or k not in reference:
+            continue
+        diff = np.abs(np.asarray(computed[k]) - np.asarray(reference[k]))
+        diff = diff[np.isfinite(diff)]
+        worst = float(np.max(diff)) if len(diff) > 0 else 0.0
+        result[k] = (worst, worst <= tolerance)
+    return result
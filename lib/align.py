@@ -0,0 +1,125 @@
+import numpy as np
+
+########################################################################
+
+# Time alignment of datasets recorded by different sensors. A dataset is
+# a dict of equal length numpy columns, one of which holds the sample
+# times. The streams we log run at different rates and with different
+# start and end times, so before comparing, say, beta from the probe
+# with Y acceleration from the accelerometer, both are resampled onto a
+# shared time grid.
+#
+# Resampling methods:
+#
+#     linear  -- linear interpolation between the samples on either side
+#     nearest -- the value of the closest sample
+#     asof    -- the value of the latest sample at or before each time
+#
+# Grid times outside the span of a dataset's samples are NaN, as are
+# times that fall in a gap between samples longer than 'max_gap'
+# seconds, if given. The exception is 'asof', which holds the last
+# sample past the end of the dataset, and across a gap for up to
+# 'max_gap' seconds.
+
+########################################################################
+
+# Subtract the earliest time of any of the datasets from all of their
+# time columns, so they share a zero. Returns the time subtracted.
+
+def zero_times(datasets, time='time'):
+    start = min(np.min(d[time]) for d in datasets if len(d[time]) > 0)
+    for d in datasets:
+        d[time] = np.asarray(d[time]) - start
+    return start
+
+# The dataset sorted by time, if it is not already.
+
+def sort_by_time(dataset, time='time'):
+    t = np.asarray(dataset[time])
+    if np.all(t[1:] >= t[:-1]):
+        return dataset
+    order = np.argsort(t, kind='stable')
+    return dict((k, np.asarray(v)[order]) for (k, v) in dataset.items())
+
+# A regular grid of times covering the span in which all the datasets
+# have samples. The default step is the median sample interval of the
+# fastest dataset.
+
+def common_grid(datasets, step=None, time='time'):
+    times = [np.asarray(d[time]) for d in datasets]
+    start = max(np.min(t) for t in times)
+    end = min(np.max(t) for t in times)
+    if step is None:
+        step = min(np.median(np.diff(np.sort(t))) for t in times if len(t) > 1)
+    if end < start:
+        return np.zeros(0)
+    return start + step * np.arange(int(np.floor((end - start) / step * (1 + 1e-12))) + 1)
+
+########################################################################
+
+# For each grid time, the indices of the samples before and after it
+# and the weight of the latter, plus a mask of grid times that have no
+# value.
+
+def _bracket(t, grid, max_gap):
+    n = len(t)
+    after = np.searchsorted(t, grid, side='right')
+    lo = np.clip(after - 1, 0, max(n - 2, 0))
+    hi = np.minimum(lo + 1, n - 1)
+    span = t[hi] - t[lo]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(span > 0, (grid - t[lo]) / span, 0.0)
+    outside = (grid < t[0]) | (grid > t[-1]) if n > 0 else np.ones(len(grid), dtype=bool)
+    if max_gap is not None:
+        outside |= span > max_gap
+    return lo, hi, np.clip(weight, 0.0, 1.0), outside
+
+# Resample every column of a dataset at the times in 'grid'. The time
+# column of the result is the grid.
+
+def resample(dataset, grid, method='linear', max_gap=None, time='time'):
+    dataset = sort_by_time(dataset, time)
+    t = np.asarray(dataset[time], dtype=np.float64)
+    grid = np.asarray(grid, dtype=np.float64)
+    result = {time: grid}
+    if len(t) == 0:
+        for k in dataset.keys():
+            if k != time:
+                result[k] = np.full(len(grid), np.nan)
+        return result
+
+    lo, hi, weight, outside = _bracket(t, grid, max_gap)
+    if method == 'linear':
+        pass
+    elif method == 'nearest':
+        index = np.where(weight > 0.5, hi, lo)
+    elif method == 'asof':
+        index = np.where(weight >= 1.0, hi, lo)
+        outside = grid < t[0]
+        if max_gap is not None:
+            outside |= grid - t[index] > max_gap
+    else:
+        raise ValueError('unknown resampling method: %s' % method)
+
+    for (k, v) in dataset.items():
+        if k == time:
+            continue
+        v = np.asarray(v, dtype=np.float64)
+        if method == 'linear':
+            r = v[lo] + weight * (v[hi] - v[lo])
+            # Do not let a NaN on one side leak into exact hits on the other.
+            r = np.where(weight == 0.0, v[lo], np.where(weight == 1.0, v[hi], r))
+        else:
+            r = v[index]
+        r[outside] = np.nan
+        result[k] = r
+    return result
+
+# Resample any number of datasets onto one grid. If no grid is given,
+# common_grid() is used with the given 'step'. Returns a list of the
+# resampled datasets, in order.
+
+def align(datasets, grid=None, step=None, method='linear', max_gap=None, time='time'):
+    if grid is None:
+        grid = common_grid(datasets, step, time)
+    return [resample(d, grid, method, max_gap, time) for d in datasets]
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+import telemetry
+
+########################################################################
+
+# Cache of parsed logs. The logs we process never change once recorded,
+# so the columns telemetry.read_columns() returns for a log are saved
+# as .npy files the first time and memory mapped on later runs. Nothing
+# is parsed, and a column is only paged in from disk as it is used.
+#
+# The cache lives in a '__logcache__' directory next to each log:
+#
+#     <log>.json  -- the size, mtime and content hash of <log> when it
+#                    was last hashed
+#     <key>/      -- one entry: a .npy file per column and 'meta.json'
+#
+# An entry key is a hash of the log's content hash, the parser version,
+# this cache's format version and the read_columns() arguments, so any
+# change to the log or to how it is read gives a new entry. The content
+# of a log is only rehashed when its size or mtime change.
+#
+# Arrays from the cache are read only.
+
+CACHE_DIR = '__logcache__'
+
+# Bump this whenever the layout of the cache changes.
+_FORMAT_VERSION = 1
+
+_HASH_BLOCK = 1 << 20
+
+########################################################################
+
+def _content_hash(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _read_json(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+def _write_json(filename, value):
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(value, f)
+    os.replace(filename + '.tmp', filename)
+
+# The content hash of 'filename', recomputed only if the file changed
+# since it was last hashed. Entries for the old content are removed.
+
+def _source_hash(cache_dir, filename):
+    st = os.stat(filename)
+    if not os.path.isdir(cache_dir):
+        os.mkdir(cache_dir)
+    index_name = os.path.join(cache_dir, os.path.basename(filename) + '.json')
+    index = _read_json(index_name)
+    if index is not None and index['size'] == st.st_size and index['mtime_ns'] == st.st_mtime_ns:
+        return index['hash']
+    content_hash = _content_hash(filename)
+    if index is not None and index['hash'] != content_hash:
+        _remove_entries(cache_dir, index['hash'])
+    _write_json(index_name, {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'hash': content_hash,
+    })
+    return content_hash
+
+def _remove_entries(cache_dir, content_hash):
+    for name in os.listdir(cache_dir):
+        meta = _read_json(os.path.join(cache_dir, name, 'meta.json'))
+        if meta is not None and meta['hash'] == content_hash:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+def _entry_key(content_hash, cols, dtype, usecols, header):
+    if isinstance(dtype, dict):
+        dtype = dict((c, np.dtype(d).str) for (c, d) in dtype.items())
+    else:
+        dtype = np.dtype(dtype).str
+    key = json.dumps({
+        'hash': content_hash,
+        'parser': telemetry.PARSER_VERSION,
+        'format': _FORMAT_VERSION,
+        'cols': cols,
+        'dtype': dtype,
+        'usecols': None if usecols is None else [int(i) for i in usecols],
+        'header': header,
+    }, sort_keys=True)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+########################################################################
+
+def _load_entry(entry_dir):
+    meta = _read_json(os.path.join(entry_dir, 'meta.json'))
+    if meta is None:
+        return None
+    result = {}
+    for (i, c) in enumerate(meta['cols']):
+        filename = os.path.join(entry_dir, '%d.npy' % i)
+        # An empty file cannot be memory mapped.
+        mmap_mode = 'r' if meta['length'] > 0 else None
+        result[c] = np.load(filename, mmap_mode=mmap_mode)
+    return result, meta['skipped']
+
+# Write the entry to a temporary directory and move it into place, so a
+# reader never sees half an entry. If another process got there first,
+# its entry is kept.
+
+def _save_entry(cache_dir, entry_dir, content_hash, columns, skipped):
+    tmp = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        cols = list(columns.keys())
+        for (i, c) in enumerate(cols):
+            np.save(os.path.join(tmp, '%d.npy' % i), columns[c])
+        _write_json(os.path.join(tmp, 'meta.json'), {
+            'hash': content_hash,
+            'cols': cols,
+            'length': len(columns[cols[0]]) if len(cols) > 0 else 0,
+            'skipped': skipped,
+        })
+        os.rename(tmp, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+########################################################################
+
+# Same as telemetry.read_columns(), for a log given by file name, with
+# the results cached. If the cache directory cannot be written, the log
+# is parsed every time as before.
+
+def read_columns(filename, cols, dtype=np.float64, usecols=None, header=False, return_skipped=False):
+    def parse():
+        return telemetry.read_columns(
+            filename, cols,
+            dtype=dtype, usecols=usecols, header=header, return_skipped=True)
+
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR)
+    try:
+        content_hash = _source_hash(cache_dir, filename)
+    except OSError:
+        content_hash = None
+
+    if content_hash is None:
+        columns, skipped = parse()
+    else:
+        entry_dir = os.path.join(cache_dir, _entry_key(content_hash, cols, dtype, usecols, header))
+        entry = _load_entry(entry_dir)
+        if entry is not None:
+            columns, skipped = entry
+        else:
+            columns, skipped = parse()
+            _save_entry(cache_dir, entry_dir, content_hash, columns, skipped)
+
+    if return_skipped:
+        return columns, skipped
+    return columns
+
+# Remove the cached entries of the given log.
+
+def clear(filename):
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR)
+    index = _read_json(os.path.join(cache_dir, os.path.basename(filename) + '.json'))
+    if index is not None:
+        _remove_entries(cache_dir, index['hash'])
+        os.remove(os.path.join(cache_dir, os.path.basename(filename) + '.json'))
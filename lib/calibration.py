@@ -0,0 +1,211 @@
+import json
+import numpy as np
+
+import airdata
+import cache
+import probemodel
+import sweepstore
+
+########################################################################
+
+# Fitting measured probe data to potential flow theory.
+#
+# The simplest calibration is a single scale factor per channel, under
+# the hypothesis that data = scale * theory. The least squares scale
+# has a closed form,
+#
+#     scale = sum(data * theory) / sum(theory^2)
+#
+# so there is no need to search for it.
+
+########################################################################
+
+def _masked(data, theory, mask):
+    data = np.asarray(data, dtype=np.float64)
+    theory = np.asarray(theory, dtype=np.float64)
+    if mask is None:
+        mask = np.ones(data.shape, dtype=bool)
+    mask = mask & np.isfinite(data) & np.isfinite(theory)
+    return data[mask], theory[mask]
+
+# The least squares scale factor between 'data' and 'theory', using only
+# points where 'mask' is True (all points by default) and both are
+# finite. Returns a tuple (scale, residuals), the residuals being
+# data - scale * theory at the points used.
+
+def fit_scale(data, theory, mask=None):
+    d, t = _masked(data, theory, mask)
+    scale = np.dot(d, t) / np.dot(t, t)
+    return scale, d - scale * t
+
+# The total squared error between 'data' and each of 'scales' times
+# 'theory', as an array with one entry per scale.
+
+def scale_error_curve(data, theory, scales, mask=None):
+    d, t = _masked(data, theory, mask)
+    scales = np.asarray(scales, dtype=np.float64)
+    e = d - scales[..., np.newaxis] * t
+    return np.sum(e * e, axis=-1)
+
+########################################################################
+
+# Calibration surfaces. A single scale cannot capture how the probe
+# departs from theory differently at different angles, so for each
+# channel and each airspeed of a sweep we fit a smooth correction
+# c(alpha, beta) such that
+#
+#     data = c(alpha, beta) * theory
+#
+# with c a polynomial in alpha and beta (radians). Fitting c times the
+# theory, rather than the ratio data / theory, keeps points where the
+# theory is near zero from blowing up the fit. The fit is linear in the
+# polynomial coefficients, so all (airspeed, channel) pairs are solved
+# at once as one batch of least squares problems.
+#
+# A set of surfaces is a dict that is saved as JSON:
+#
+#     degree   -- the total degree of the polynomials
+#     terms    -- the exponents [i, j] of alpha^i beta^j, in order
+#     speed    -- name of the airspeed key, e.g. 'mph'
+#     speeds   -- the airspeeds of the sweep, in increasing order
+#     channels -- maps each channel name to a list, per airspeed, of
+#                 the coefficients of its terms
+#     rms      -- maps each channel name to a list, per airspeed, of
+#                 [rms error of theory alone, rms error after correction]
+
+def polynomial_terms(degree):
+    return [[i, n - i] for n in range(0, degree + 1) for i in range(n, -1, -1)]
+
+# The polynomial terms evaluated at arrays of angles, stacked along a
+# new last axis.
+
+def polynomial_basis(alpha, beta, terms):
+    alpha = np.asarray(alpha, dtype=np.float64)
+    beta = np.asarray(beta, dtype=np.float64)
+    return np.stack([alpha ** i * beta ** j for (i, j) in terms], axis=-1)
+
+# Relative weight of the ridge term that keeps sparsely sampled speeds
+# solvable.
+
+_REGULARIZATION = 1e-9
+
+# Fit surfaces given arrays, one entry per sweep point, of the angles in
+# radians and the airspeed, and dicts mapping each channel name to
+# arrays of measured data and of theory at those points. Points where
+# either is not finite are ignored.
+
+def fit_surfaces(alpha, beta, speed, data, theory, degree=2, speed_name='mph'):
+    speed = np.asarray(speed, dtype=np.float64)
+    speeds = np.unique(speed)
+    channels = sorted(data.keys())
+    terms = polynomial_terms(degree)
+    basis = polynomial_basis(alpha, beta, terms)
+
+    d = np.array([np.asarray(data[c], dtype=np.float64) for c in channels])
+    t = np.array([np.asarray(theory[c], dtype=np.float64) for c in channels])
+    use = np.isfinite(d) & np.isfinite(t)
+    d = np.where(use, d, 0.0)
+    t = np.where(use, t, 0.0)
+
+    # Weights [speed, channel, point] select the points of each problem.
+    w = (speed[np.newaxis, :] == speeds[:, np.newaxis])[:, np.newaxis, :] & use[np.newaxis, :, :]
+    x = t[:, :, np.newaxis] * basis[np.newaxis, :, :]
+    m = np.einsum('scn,cnk,cnl->sckl', w, x, x)
+    v = np.einsum('scn,cnk,cn->sck', w, x, d)
+    # The ridge pulls towards c = 1, plain theory, which is also the
+    # answer for a channel with no data at some speed.
+    ridge = _REGULARIZATION * np.trace(m, axis1=-2, axis2=-1) / len(terms)
+    ridge = np.where(ridge > 0, ridge, 1.0)[..., np.newaxis]
+    identity = np.zeros(len(terms))
+    identity[terms.index([0, 0])] = 1.0
+    m = m + ridge[..., np.newaxis] * np.eye(len(terms))
+    v = v + ridge * identity
+    coefficients = np.linalg.solve(m, v[..., np.newaxis])[..., 0]
+
+    fitted = np.einsum('sck,cnk->scn', coefficients, x)
+    count = np.maximum(np.sum(w, axis=-1), 1)
+    before = np.sqrt(np.sum(w * (d - t) ** 2, axis=-1) / count)
+    after = np.sqrt(np.sum(w * (d[np.newaxis] - fitted) ** 2, axis=-1) / count)
+
+    return {
+        'degree': degree,
+        'terms': terms,
+        'speed': speed_name,
+        'speeds': speeds.tolist(),
+        'channels': dict(
+            (c, coefficients[:, i, :].tolist()) for (i, c) in enumerate(channels)),
+        'rms': dict(
+            (c, np.stack([before[:, i], after[:, i]], axis=-1).tolist())
+            for (i, c) in enumerate(channels)),
+    }
+
+def save_surfaces(surfaces, filename):
+    with open(filename, 'w') as f:
+        json.dump(surfaces, f, indent=2)
+
+def load_surfaces(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+# The correction c(alpha, beta) of a channel at arrays of angles in
+# radians and airspeeds. Coefficients are interpolated linearly between
+# the airspeeds of the sweep, and held beyond them. Multiply theory by
+# the result to get the expected measurement.
+
+def evaluate_surface(surfaces, channel, alpha, beta, speed):
+    speeds = np.array(surfaces['speeds'])
+    coefficients = np.array(surfaces['channels'][channel])
+    basis = polynomial_basis(alpha, beta, surfaces['terms'])
+    speed = np.broadcast_to(np.asarray(speed, dtype=np.float64), basis.shape[:-1])
+    c = np.stack([np.interp(speed, speeds, coefficients[:, k])
+                  for k in range(coefficients.shape[1])], axis=-1)
+    return np.sum(basis * c, axis=-1)
+
+########################################################################
+
+# Probe sweeps, as recorded by ProbeTest on the car or the bench: rows
+# of 'mph, alpha, beta, seq, baro, oat, dp0, dpA, dpB', angles in
+# degrees. The channels are compared to theory as fractions of q. Note
+# that dpA is (upper hole) - (lower hole), the opposite sign to
+# probemodel.py, as the probe reports it.
+
+CHANNELS = ['dp0_q', 'dpA_q', 'dpB_q']
+
+def speed_from_mph(mph):
+    return mph * 0.44704
+
+# Dynamic pressure at 'mph' given the barometric pressure in Pa and the
+# air temperature in degrees C.
+
+def q(baro, oat, mph):
+    return 0.5 * airdata.air_density(baro, oat) * (speed_from_mph(mph) ** 2)
+
+# Read a sweep, either a .sweep file or a CSV file in the same layout,
+# without the rows where no reading was taken (dp0 of zero).
+
+def read_sweep(filename):
+    if filename.endswith(sweepstore.EXTENSION):
+        d = sweepstore.read_points(filename)
+    else:
+        d = cache.read_columns(filename, None, header=True)
+    keep = d['dp0'] != 0.0
+    return dict((k, v[keep]) for (k, v) in d.items())
+
+# Add q and the CHANNELS to a sweep.
+
+def add_sweep_ratios(d):
+    d['q'] = q(d['baro'], d['oat'], d['mph'])
+    d['dp0_q'] = d['dp0'] / d['q']
+    d['dpA_q'] = d['dpA'] / d['q']
+    d['dpB_q'] = d['dpB'] / d['q']
+
+# The CHANNELS of the v2 probe model at arrays of angles in degrees,
+# times 'scaling'.
+
+def theory(alpha, beta, scaling=1.0):
+    c = probemodel.probe_channels(np.radians(alpha), np.radians(beta), scaling, 'v2')
+    return {
+        'dp0_q': c['dp0'],
+        'dpA_q': -c['dpa'],
+        'dpB_q': c['dpb'],
+    }
@@ -0,0 +1,283 @@
+import re
+import struct
+import sys
+import time
+import numpy as np
+
+########################################################################
+
+# Recording a sentence stream at full rate. Lines arrive in large chunks
+# (from a socket or a serial port) and are split in bulk; each chunk's
+# lines are stamped with one time from a Clock, and appended as binary
+# records to files that a RotatingWriter batches and rotates by size or
+# age.
+#
+# A capture file starts with a header
+#
+#     magic 'CAP1', the wall clock time at which the file was started
+#     (float64)
+#
+# followed by one record per line:
+#
+#     time (float64, seconds since the epoch), length (uint16), and
+#     the line itself, without its line ending
+#
+# all little endian. read_records() reads a file back, stopping at an
+# incomplete last record, as left by a crash. The same lines can also
+# be mirrored as text, 'time,line' per line, the layout tcpread.py has
+# always written.
+
+EXTENSION = '.cap'
+TEXT_EXTENSION = '.csv'
+
+_MAGIC = b'CAP1'
+_FILE_HEADER = struct.Struct('<4sd')
+_RECORD_HEADER = struct.Struct('<dH')
+
+_MAX_LINE = 65535
+
+_LINE = re.compile(rb'[^\r\n]+')
+
+########################################################################
+
+# The time.time() of now, but advancing with time.monotonic(), so that
+# timestamps never step backwards or jump when the system clock is set.
+# The wall clock is read once, when the Clock is made.
+
+class Clock:
+
+    def __init__(self):
+        self.__wall = time.time()
+        self.__monotonic = time.monotonic()
+
+    def now(self):
+        return self.__wall + (time.monotonic() - self.__monotonic)
+
+# Split a chunk received after 'pending', the unfinished line of the
+# last chunk, into its complete lines and the new unfinished line. Lines
+# may end in CR, LF or both; empty lines are dropped.
+
+def split_lines(pending, chunk):
+    lines = (pending + chunk).replace(b'\r', b'\n').split(b'\n')
+    pending = lines.pop()
+    return [l for l in lines if len(l) > 0], pending
+
+# The same for a receive buffer that is kept and appended to: the
+# (start, end) offsets of the complete, non-empty lines in 'data', and
+# the offset just past the last line ending, up to which the caller can
+# drop the buffer. The lines can be sliced out of a memoryview of the
+# buffer without copying them.
+
+def line_spans(data):
+    end = max(data.rfind(b'\n'), data.rfind(b'\r')) + 1
+    return [m.span() for m in _LINE.finditer(data, 0, end)], end
+
+########################################################################
+
+def file_header(now):
+    return _FILE_HEADER.pack(_MAGIC, now)
+
+# The binary records of 'lines', all stamped with time t.
+
+def encode_records(t, lines):
+    return b''.join(
+        _RECORD_HEADER.pack(t, len(l)) + l
+        for l in (l[0:_MAX_LINE] for l in lines))
+
+def encode_text(t, lines):
+    prefix = b'%.6f,' % t
+    return b''.join(prefix + l + b'\n' for l in lines)
+
+# Read a capture file. Returns the times as an array and the lines as a
+# list of bytes.
+
+def read_records(filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if len(data) < _FILE_HEADER.size or data[0:4] != _MAGIC:
+        raise ValueError('not a capture file: %s' % filename)
+    times = []
+    lines = []
+    offset = _FILE_HEADER.size
+    while offset + _RECORD_HEADER.size <= len(data):
+        (t, n) = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + _RECORD_HEADER.size
+        if start + n > len(data):
+            break
+        times.append(t)
+        lines.append(data[start:start + n])
+        offset = start + n
+    return np.array(times), lines
+
+########################################################################
+
+# Batched writes to a series of files
+# '<prefix>-<date>-<time>-<n><extension>', n counting from 000 so that
+# they sort in order. Data is kept in memory until there is
+# 'batch_bytes' of it or it is 'flush_seconds' old, then written and
+# flushed in one call. A new file is started when the current one would
+# grow past 'max_bytes' or is 'max_seconds' old; None means no limit.
+# 'header', if given, is called with the time to give the first bytes of
+# each file.
+#
+# Times are those passed to write() and poll(), which should be called
+# every so often even when there is nothing to write, so the last data
+# does not wait for more.
+
+class RotatingWriter:
+
+    def __init__(self, prefix, extension, header=None, max_bytes=64 << 20, max_seconds=3600.0,
+                 flush_seconds=1.0, batch_bytes=1 << 16):
+        self.__prefix = prefix
+        self.__extension = extension
+        self.__header = header
+        self.__max_bytes = max_bytes
+        self.__max_seconds = max_seconds
+        self.__flush_seconds = flush_seconds
+        self.__batch_bytes = batch_bytes
+        self.__buffer = bytearray()
+        self.__buffered_at = None
+        self.__file = None
+        self.__opened_at = None
+        self.__size = 0
+        self.__files = []
+
+    # The names of the files written so far, oldest first.
+
+    def files(self):
+        return list(self.__files)
+
+    def write(self, data, now):
+        if len(data) == 0:
+            return self.poll(now)
+        if self.__buffered_at is None:
+            self.__buffered_at = now
+        self.__buffer += data
+        self.poll(now)
+
+    def poll(self, now):
+        if len(self.__buffer) == 0:
+            return
+        if len(self.__buffer) >= self.__batch_bytes or now - self.__buffered_at >= self.__flush_seconds:
+            self.flush(now)
+
+    def flush(self, now):
+        if len(self.__buffer) == 0:
+            return
+        if self.__file is None or self.__due(now):
+            self.__rotate(now)
+        self.__file.write(self.__buffer)
+        self.__file.flush()
+        self.__size += len(self.__buffer)
+        self.__buffer = bytearray()
+        self.__buffered_at = None
+
+    def close(self, now=None):
+        self.flush(time.time() if now is None else now)
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __due(self, now):
+        if self.__max_bytes is not None and self.__size + len(self.__buffer) > self.__max_bytes:
+            return True
+        return self.__max_seconds is not None and now - self.__opened_at >= self.__max_seconds
+
+    def __rotate(self, now):
+        if self.__file is not None:
+            self.__file.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+        filename = '%s-%s-%03d%s' % (self.__prefix, stamp, len(self.__files), self.__extension)
+        self.__file = open(filename, 'wb')
+        self.__opened_at = now
+        self.__size = 0
+        self.__files.append(filename)
+        if self.__header is not None:
+            self.__buffer[0:0] = self.__header(now)
+
+# Binary capture files '<prefix>-<date>-<time>-<n>.cap' and, with 'text'
+# set, a text mirror of the same lines in '.csv' files rotated alike.
+# Other arguments are passed to RotatingWriter.
+
+class Capture:
+
+    def __init__(self, prefix, text=False, **kwargs):
+        self.__binary = RotatingWriter(prefix, EXTENSION, file_header, **kwargs)
+        self.__text = RotatingWriter(prefix, TEXT_EXTENSION, **kwargs) if text else None
+
+    def add(self, t, lines):
+        self.__binary.write(encode_records(t, lines), t)
+        if self.__text is not None:
+            self.__text.write(encode_text(t, lines), t)
+
+    def poll(self, now):
+        for w in self.__writers():
+            w.poll(now)
+
+    def close(self, now=None):
+        for w in self.__writers():
+            w.close(now)
+
+    def files(self):
+        return sum([w.files() for w in self.__writers()], [])
+
+    def __writers(self):
+        return [w for w in [self.__binary, self.__text] if w is not None]
+
+########################################################################
+
+# True at most once per 'interval' seconds, for rate-limited printing.
+
+class RateLimiter:
+
+    def __init__(self, interval):
+        self.__interval = interval
+        self.__next = None
+
+    def ready(self, now):
+        if self.__next is not None and now < self.__next:
+            return False
+        self.__next = now + self.__interval
+        return True
+
+# Counts of lines, bytes and, if the caller can tell, overruns (data
+# lost before it was read), reported as rates once per 'interval'
+# seconds to 'stream'.
+
+class Meter:
+
+    def __init__(self, interval=1.0, stream=sys.stderr):
+        self.__limiter = RateLimiter(interval)
+        self.__stream = stream
+        self.__since = None
+        self.__lines = 0
+        self.__bytes = 0
+        self.__overruns = 0
+        self.__total = 0
+        self.__total_overruns = 0
+
+    def add(self, lines, nbytes, now, overruns=0):
+        if self.__since is None:
+            self.__since = now
+            self.__limiter.ready(now)
+        self.__lines += lines
+        self.__bytes += nbytes
+        self.__overruns += overruns
+        self.__total += lines
+        self.__total_overruns += overruns
+        self.report(now)
+
+    def report(self, now):
+        if self.__since is None or not self.__limiter.ready(now):
+            return
+        elapsed = max(now - self.__since, 1e-9)
+        s = '%.0f lines/s, %.0f bytes/s, %d lines in all' % (
+            self.__lines / elapsed, self.__bytes / elapsed, self.__total)
+        if self.__total_overruns > 0:
+            s += ', %d overruns (%d in all)' % (self.__overruns, self.__total_overruns)
+        self.__stream.write(s + '\n')
+        self.__stream.flush()
+        self.__since = now
+        self.__lines = 0
+        self.__bytes = 0
+        self.__overruns = 0
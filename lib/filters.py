@@ -0,0 +1,174 @@
+import collections
+import math
+import numpy as np
+import scipy.signal
+
+########################################################################
+
+# Smoothing filters for telemetry columns. Each filter comes in two
+# forms that give the same results:
+#
+#   - a function taking a whole column (or dataset) at once, for
+#     processing logs offline, and
+#
+#   - a class with a push(sample) method, for running on a live stream
+#     one sample at a time.
+#
+# Moving averages cost O(n) regardless of the window, using running
+# sums rather than a convolution. As with np.convolve, a window that
+# contains a NaN averages to NaN.
+
+########################################################################
+
+# The average of each run of 'window' consecutive values. As with
+# np.convolve(values, ones(window) / window, 'valid'), the result has
+# len(values) - window + 1 entries; entry i averages values[i] through
+# values[i + window - 1].
+
+def moving_average(values, window):
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values) - window + 1
+    if n <= 0:
+        return np.zeros(0)
+    nan = ~np.isfinite(values)
+    finite = np.where(nan, 0.0, values)
+    # Summing relative to the first value keeps the running sum small, so
+    # rounding does not build up over a long log.
+    offset = finite[np.argmax(~nan)] if not np.all(nan) else 0.0
+    sums = np.concatenate(([0.0], np.cumsum(np.where(nan, 0.0, finite - offset))))
+    nans = np.concatenate(([0], np.cumsum(nan)))
+    result = (sums[window:] - sums[:n]) / window + offset
+    result[nans[window:] - nans[:n] > 0] = np.nan
+    return result
+
+# The time at which each moving average applies. With 'trailing', this
+# is the time of the newest sample in the window; with 'centered', the
+# midpoint of the first and last sample times.
+
+def moving_average_time(time, window, align='trailing'):
+    time = np.asarray(time, dtype=np.float64)
+    if align == 'trailing':
+        return time[window - 1:]
+    if align == 'centered':
+        return (time[:len(time) - window + 1] + time[window - 1:]) / 2.0
+    raise ValueError('unknown alignment: %s' % align)
+
+# Moving average of every column of a dataset except the time column,
+# which is aligned to the averages as per moving_average_time().
+
+def moving_average_dataset(dataset, window, align='trailing', time='time'):
+    result = {}
+    for key in dataset.keys():
+        if key == time:
+            result[key] = moving_average_time(dataset[key], window, align)
+        else:
+            result[key] = moving_average(dataset[key], window)
+    return result
+
+# Live version of moving_average(). push() returns the average of the
+# last 'window' samples, or None until that many have been pushed.
+
+class MovingAverage:
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError('window must be at least 1')
+        self.__window = window
+        self.__samples = collections.deque(maxlen=window)
+        self.__sum = 0.0
+        self.__nans = 0
+        self.__pushes = 0
+
+    def push(self, sample):
+        sample = float(sample)
+        if len(self.__samples) == self.__window:
+            self.__remove(self.__samples[0])
+        self.__samples.append(sample)
+        if math.isfinite(sample):
+            self.__sum += sample
+        else:
+            self.__nans += 1
+        # Resum now and then so rounding does not build up.
+        self.__pushes += 1
+        if self.__pushes % self.__window == 0:
+            self.__sum = math.fsum(x for x in self.__samples if math.isfinite(x))
+        if len(self.__samples) < self.__window:
+            return None
+        if self.__nans > 0:
+            return math.nan
+        return self.__sum / self.__window
+
+    def reset(self):
+        self.__samples.clear()
+        self.__sum = 0.0
+        self.__nans = 0
+        self.__pushes = 0
+
+    def __remove(self, sample):
+        if math.isfinite(sample):
+            self.__sum -= sample
+        else:
+            self.__nans -= 1
+
+########################################################################
+
+# Exponential smoothing,
+#
+#     y[i] = y[i - 1] + weight * (x[i] - y[i - 1])
+#
+# starting from y[0] = x[0]. 'weight' is between 0 and 1; smaller is
+# smoother. NaN samples are skipped, repeating the previous output.
+
+def exponential_smoothing(values, weight):
+    values = np.asarray(values, dtype=np.float64)
+    if not 0.0 < weight <= 1.0:
+        raise ValueError('weight must be in (0, 1]')
+    result = np.full(len(values), np.nan)
+    finite = np.flatnonzero(np.isfinite(values))
+    if len(finite) == 0:
+        return result
+    x = values[finite]
+    decay = 1.0 - weight
+    y, _ = scipy.signal.lfilter([weight], [1.0, -decay], x, zi=[decay * x[0]])
+    # Repeat the last output over skipped NaN samples.
+    last = np.maximum.accumulate(np.where(np.isfinite(values), np.arange(len(values)), -1))
+    valid = last >= 0
+    result[valid] = y[np.searchsorted(finite, last[valid])]
+    return result
+
+# Exponential smoothing of every column of a dataset except the time
+# column, which is copied as is.
+
+def exponential_smoothing_dataset(dataset, weight, time='time'):
+    result = {}
+    for key in dataset.keys():
+        if key == time:
+            result[key] = np.asarray(dataset[key])
+        else:
+            result[key] = exponential_smoothing(dataset[key], weight)
+    return result
+
+# Live version of exponential_smoothing(). push() returns the smoothed
+# value, or None until a finite sample has been pushed.
+
+class ExponentialSmoothing:
+
+    def __init__(self, weight):
+        if not 0.0 < weight <= 1.0:
+            raise ValueError('weight must be in (0, 1]')
+        self.__weight = weight
+        self.__value = None
+
+    def push(self, sample):
+        sample = float(sample)
+        if math.isfinite(sample):
+            if self.__value is None:
+                self.__value = sample
+            else:
+                self.__value += self.__weight * (sample - self.__value)
+        return self.__value
+
+    def reset(self):
+        self.__value = None
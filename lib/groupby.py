@@ -0,0 +1,77 @@
+import numpy as np
+
+########################################################################
+
+# Group-by reduction of datasets (dicts of equal length numpy columns).
+# Rows are grouped by the values of one or more key columns, such as
+# (mph, alpha, beta) for a probe sweep, and each value column is reduced
+# to per-group statistics in a few array passes: np.unique gives every
+# row a group number, np.bincount sums by group, and one sort by group
+# gives the minima and maxima.
+
+STATISTICS = ['mean', 'std', 'count', 'min', 'max']
+
+########################################################################
+
+# The group number of every row, and the key values of each group as a
+# dict of columns. Groups are in sorted order of their keys.
+
+def group(dataset, keys):
+    if len(keys) == 0:
+        raise ValueError('at least one key is needed')
+    codes = []
+    uniques = []
+    for k in keys:
+        u, inverse = np.unique(np.asarray(dataset[k]), return_inverse=True)
+        uniques.append(u)
+        codes.append(inverse.ravel())
+    combined = np.ravel_multi_index(codes, [len(u) for u in uniques])
+    cells, inverse = np.unique(combined, return_inverse=True)
+    cell_codes = np.unravel_index(cells, [len(u) for u in uniques])
+    key_values = dict((k, uniques[i][cell_codes[i]]) for (i, k) in enumerate(keys))
+    return inverse.ravel(), key_values
+
+# Reduce the given columns of a dataset by the given keys. The result is
+# a dataset with one row per group, holding the key columns plus, for
+# each column 'c' and each of the requested statistics:
+#
+#     c          -- mean
+#     c_std      -- standard deviation, with 'ddof' as for np.std
+#     c_min      -- minimum
+#     c_max      -- maximum
+#
+# and a single 'count' column with the number of rows in each group. A
+# NaN in a group makes its mean, std, min and max NaN.
+
+def reduce(dataset, keys, columns, statistics=STATISTICS, ddof=0):
+    inverse, result = group(dataset, keys)
+    ngroups = len(result[keys[0]])
+    count = np.bincount(inverse, minlength=ngroups)
+    if 'count' in statistics:
+        result['count'] = count
+
+    if 'min' in statistics or 'max' in statistics:
+        order = np.argsort(inverse, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+
+    for c in columns:
+        v = np.asarray(dataset[c], dtype=np.float64)
+        mean = np.bincount(inverse, weights=v, minlength=ngroups) / count
+        if 'mean' in statistics:
+            result[c] = mean
+        if 'std' in statistics:
+            # Two passes, so large offsets do not cost precision.
+            deviation = v - mean[inverse]
+            squares = np.bincount(inverse, weights=deviation * deviation, minlength=ngroups)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[c + '_std'] = np.sqrt(squares / (count - ddof))
+        if ngroups == 0:
+            for s in ['min', 'max']:
+                if s in statistics:
+                    result[c + '_' + s] = np.zeros(0)
+            continue
+        if 'min' in statistics:
+            result[c + '_min'] = np.minimum.reduceat(v[order], starts)
+        if 'max' in statistics:
+            result[c + '_max'] = np.maximum.reduceat(v[order], starts)
+    return result
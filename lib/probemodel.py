@@ -0,0 +1,184 @@
+import math
+import numpy as np
+
+########################################################################
+
+# Potential flow model of our spherical 5-hole probes. Every function
+# takes and returns numpy arrays (or scalars), so a whole grid or log of
+# (alpha, beta) is evaluated in one call. Angles are in radians; q can
+# be in any units but we always use pascals.
+#
+# There are two probe geometries:
+#
+# ** Probe v1 **
+#
+# This is a 5-hole sphere plus a static source. The raw measurements are:
+#     (dp0, dpA, dpB)
+# where the pressures are defined as:
+#     dp0 = (center hole) - (static)
+#     dpA = (lower hole) - (upper hole)
+#     dpB = (right hole) - (left hole)
+#
+# ** Probe v2 **
+#
+# This is a 5-hole probe where the static pressure is inferred from one
+# hole on the centerline at 90 degrees from the centerline, on the bottom
+# of the spherical nose. The raw measurements are:
+#     (dp0, dpA, dpB)
+# where the pressures are defined as:
+#     dp0 = (center hole) - (bottom 90 degree hole)
+#     dpA = (lower hole) - (upper hole)
+#     dpB = (right hole) - (left hole)
+
+########################################################################
+
+# This is the core formula that computes the pressure at a given point
+# on a sphere as a function of angular offset from the stagnation point.
+# The result is a ratio of the stagnation pressure _q_.
+
+def sphere_pressure_coefficient_polar(angle):
+    return 1.0 - 9.0 / 4.0 * np.sin(angle) ** 2
+
+# This formula takes two angles, alpha and beta, and computes the
+# pressure coefficient at the given point using the distance formula.
+
+def sphere_pressure_coefficient_cartesian(alpha, beta):
+    return sphere_pressure_coefficient_polar(np.sqrt(alpha * alpha + beta * beta))
+
+# The pressure coefficient and its partial derivatives with respect to
+# alpha and beta. With r = sqrt(alpha^2 + beta^2),
+#
+#     d(cp)/d(alpha) = -9/4 sin(2r) alpha / r
+#
+# where sin(2r) / r is written with np.sinc so it is smooth at r = 0.
+
+def sphere_pressure_coefficient_gradient(alpha, beta):
+    r = np.sqrt(alpha * alpha + beta * beta)
+    k = -9.0 / 2.0 * np.sinc(2.0 * r / math.pi)
+    return sphere_pressure_coefficient_polar(r), k * alpha, k * beta
+
+########################################################################
+
+# Hole positions as (alpha, beta) offsets at which each hole sees the
+# flow. A hole sees the stagnation point when the flow angles cancel its
+# offset, so e.g. the lower hole is at alpha + pi/4.
+
+HOLES = {
+    'center': (0.0, 0.0),
+    'upper': (-math.pi / 4, 0.0),
+    'lower': (math.pi / 4, 0.0),
+    'bottom': (math.pi / 2, 0.0),
+    'left': (0.0, -math.pi / 4),
+    'right': (0.0, math.pi / 4),
+}
+
+# The holes of each channel of each geometry, as (plus, minus). A minus
+# hole of None is the static source, at a pressure coefficient of 0.
+
+GEOMETRIES = {
+    'v1': {
+        'dp0': ('center', None),
+        'dpa': ('lower', 'upper'),
+        'dpb': ('right', 'left'),
+    },
+    'v2': {
+        'dp0': ('center', 'bottom'),
+        'dpa': ('lower', 'upper'),
+        'dpb': ('right', 'left'),
+    },
+}
+
+CHANNELS = ['dp0', 'dpa', 'dpb']
+
+# Bump this whenever a change to the model changes the pressures it
+# gives. Tables built from it (see probetable.py) are keyed on it.
+MODEL_VERSION = 1
+
+def _holes(geometry):
+    return sorted(set(h for c in GEOMETRIES[geometry].values() for h in c if h is not None))
+
+# Everything the model of a geometry depends on, for keying results
+# built from it: the model version, the holes of each channel and the
+# offsets of those holes.
+
+def model_key(geometry):
+    return {
+        'version': MODEL_VERSION,
+        'geometry': geometry,
+        'channels': dict((c, list(h)) for (c, h) in GEOMETRIES[geometry].items()),
+        'holes': dict((h, list(HOLES[h])) for h in _holes(geometry)),
+    }
+
+# Evaluate 'f' at every hole in one broadcast call, by stacking the hole
+# offsets along a new leading axis.
+
+def _at_holes(f, alpha, beta, names):
+    alpha = np.asarray(alpha, dtype=np.float64)
+    beta = np.asarray(beta, dtype=np.float64)
+    offsets = np.array([HOLES[n] for n in names]).reshape((len(names), 2) + (1,) * max(alpha.ndim, beta.ndim))
+    return f(alpha + offsets[:, 0], beta + offsets[:, 1])
+
+########################################################################
+
+# The pressure at each of the named holes, as a dict keyed by hole name.
+
+def hole_pressures(alpha, beta, q=1.0, names=None):
+    names = sorted(HOLES.keys()) if names is None else names
+    cp = _at_holes(sphere_pressure_coefficient_cartesian, alpha, beta, names)
+    return dict((n, q * cp[i]) for (i, n) in enumerate(names))
+
+# The expected "raw" measurements of a probe from potential flow theory,
+# together with the pressure ratios. Returns a dict with keys:
+#
+#     dp0, dpa, dpb -- the channels, in the units of q
+#     ra, rb        -- dpa / dp0 and dpb / dp0
+
+def probe_channels(alpha, beta, q=1.0, geometry='v1'):
+    p = hole_pressures(alpha, beta, q, _holes(geometry))
+    result = {}
+    for c in CHANNELS:
+        (plus, minus) = GEOMETRIES[geometry][c]
+        result[c] = p[plus] if minus is None else p[plus] - p[minus]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['ra'] = result['dpa'] / result['dp0']
+        result['rb'] = result['dpb'] / result['dp0']
+    return result
+
+# Each channel per unit q and its partial derivatives with respect to
+# alpha and beta, as a dict mapping the channel to a tuple
+# (value, d/d(alpha), d/d(beta)).
+
+def channel_gradients(alpha, beta, geometry='v1'):
+    names = _holes(geometry)
+    cp, cp_a, cp_b = _at_holes(sphere_pressure_coefficient_gradient, alpha, beta, names)
+    index = dict((n, i) for (i, n) in enumerate(names))
+    result = {}
+    for c in CHANNELS:
+        (plus, minus) = GEOMETRIES[geometry][c]
+        i = index[plus]
+        if minus is None:
+            result[c] = (cp[i], cp_a[i], cp_b[i])
+        else:
+            j = index[minus]
+            result[c] = (cp[i] - cp[j], cp_a[i] - cp_a[j], cp_b[i] - cp_b[j])
+    return result
+
+########################################################################
+
+# The following functions take a triple of airflow parameters
+#     (alpha, beta, q)
+# and return the raw measurements [dp0, dpa, dpb].
+
+def probe_data2raw(alpha, beta, q=1.0, geometry='v1'):
+    c = probe_channels(alpha, beta, q, geometry)
+    return [c['dp0'], c['dpa'], c['dpb']]
+
+# Probe v1 version
+
+def v1_probe_data2raw(alpha, beta, q=1.0):
+    return probe_data2raw(alpha, beta, q, 'v1')
+
+# Probe v2 version
+
+def v2_probe_data2raw(alpha, beta, q=1.0):
+    return probe_data2raw(alpha, beta, q, 'v2')
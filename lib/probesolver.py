@@ -0,0 +1,186 @@
+import numpy as np
+
+import probemodel
+
+########################################################################
+
+# Batched solver for the airdata of a 5-hole probe. Given arrays of raw
+# pressures (dp0, dpa, dpb), it finds (alpha, beta, q) from potential
+# flow theory for all samples at once, by Newton's method on the 2x2
+# system
+#
+#     dpa / dp0 (alpha, beta) = ra
+#     dpb / dp0 (alpha, beta) = rb
+#
+# using analytic derivatives of the sphere pressure coefficient. The
+# probe geometries and the model are those of probemodel.py.
+
+########################################################################
+
+# The ratios (dpa / dp0, dpb / dp0) and their Jacobian with respect to
+# (alpha, beta).
+
+def _ratios(alpha, beta, geometry):
+    g = probemodel.channel_gradients(alpha, beta, geometry)
+    p0, p0_a, p0_b = g['dp0']
+    pa, pa_a, pa_b = g['dpa']
+    pb, pb_a, pb_b = g['dpb']
+    ra = pa / p0
+    rb = pb / p0
+    p0_sq = p0 * p0
+    return (
+        ra, rb,
+        (pa_a * p0 - pa * p0_a) / p0_sq,
+        (pa_b * p0 - pa * p0_b) / p0_sq,
+        (pb_a * p0 - pb * p0_a) / p0_sq,
+        (pb_b * p0 - pb * p0_b) / p0_sq,
+    )
+
+########################################################################
+
+# Largest change in either angle per Newton step, in radians. Keeps a
+# poor Jacobian far from the solution from throwing the estimate off the
+# sphere.
+
+_MAX_STEP = 0.25
+
+# Newton iteration on all samples at once. Each sample stops updating
+# once its residual is below 'tolerance'; the returned mask says which
+# samples converged.
+
+def _newton(ra, rb, alpha, beta, geometry, tolerance, max_iterations):
+    alpha = alpha.copy()
+    beta = beta.copy()
+    converged = np.zeros(ra.shape, dtype=bool)
+    active = np.flatnonzero(np.isfinite(ra) & np.isfinite(rb) &
+                            np.isfinite(alpha) & np.isfinite(beta))
+
+    for i in range(0, max_iterations + 1):
+        if len(active) == 0:
+            break
+        a = alpha[active]
+        b = beta[active]
+        fa, fb, j11, j12, j21, j22 = _ratios(a, b, geometry)
+        fa = fa - ra[active]
+        fb = fb - rb[active]
+
+        done = np.abs(fa) + np.abs(fb) < tolerance
+        converged[active[done]] = True
+        if i == max_iterations:
+            break
+
+        keep = ~done
+        active = active[keep]
+        fa, fb = fa[keep], fb[keep]
+        j11, j12, j21, j22 = j11[keep], j12[keep], j21[keep], j22[keep]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            det = j11 * j22 - j12 * j21
+            da = (j22 * fa - j12 * fb) / det
+            db = (j11 * fb - j21 * fa) / det
+        da = np.clip(da, -_MAX_STEP, _MAX_STEP)
+        db = np.clip(db, -_MAX_STEP, _MAX_STEP)
+
+        alpha[active] = a[keep] - da
+        beta[active] = b[keep] - db
+
+    return alpha, beta, converged
+
+# Solve for (alpha, beta) in radians from arrays of pressure ratios
+# ra = dpa / dp0 and rb = dpb / dp0. Returns [alpha, beta, converged];
+# angles of samples that did not converge are NaN.
+#
+#     initial     -- optional (alpha, beta) arrays to start from. By
+#                    default every sample starts at (0, 0).
+#     warm_start  -- treat the samples as a time series. A sparse subset
+#                    of samples is solved first, and every sample starts
+#                    from the solution of the subset sample before it,
+#                    provided their ratios differ by less than
+#                    'warm_distance'. Samples that fail are retried from
+#                    'initial', then from the solution of the sample
+#                    before them.
+
+def solve_angles(ra, rb, geometry='v1', initial=None, warm_start=False,
+                 tolerance=1e-10, max_iterations=30, stride=16, retries=3,
+                 warm_distance=0.1):
+    ra = np.asarray(ra, dtype=np.float64)
+    rb = np.asarray(rb, dtype=np.float64)
+    shape = ra.shape
+    ra = ra.ravel()
+    rb = rb.ravel()
+    n = len(ra)
+
+    if initial is None:
+        alpha0 = np.zeros(n)
+        beta0 = np.zeros(n)
+    else:
+        alpha0 = np.broadcast_to(np.asarray(initial[0], dtype=np.float64), shape).ravel().copy()
+        beta0 = np.broadcast_to(np.asarray(initial[1], dtype=np.float64), shape).ravel().copy()
+
+    def near(i, j):
+        return np.abs(ra[i] - ra[j]) + np.abs(rb[i] - rb[j]) < warm_distance
+
+    alpha_start = alpha0
+    beta_start = beta0
+    if warm_start and n > stride:
+        seeds = np.arange(0, n, stride)
+        sa, sb, ok = _newton(ra[seeds], rb[seeds], alpha0[seeds], beta0[seeds],
+                             geometry, tolerance, max_iterations)
+        # Start from the last converged seed, if it is close enough.
+        last = np.maximum.accumulate(np.where(ok, np.arange(len(seeds)), -1))[np.arange(n) // stride]
+        warm = np.flatnonzero(last >= 0)
+        warm = warm[near(warm, seeds[last[warm]])]
+        alpha_start = alpha0.copy()
+        beta_start = beta0.copy()
+        alpha_start[warm] = sa[last[warm]]
+        beta_start[warm] = sb[last[warm]]
+
+    alpha, beta, converged = _newton(ra, rb, alpha_start, beta_start, geometry, tolerance, max_iterations)
+
+    def retry(index, a0, b0):
+        a, b, ok = _newton(ra[index], rb[index], a0, b0, geometry, tolerance, max_iterations)
+        alpha[index[ok]] = a[ok]
+        beta[index[ok]] = b[ok]
+        converged[index[ok]] = True
+
+    if warm_start:
+        index = np.flatnonzero(~converged & ((alpha_start != alpha0) | (beta_start != beta0)))
+        retry(index, alpha0[index], beta0[index])
+        for i in range(0, retries):
+            index = np.flatnonzero(~converged[1:] & converged[:-1]) + 1
+            index = index[near(index, index - 1)]
+            if len(index) == 0:
+                break
+            retry(index, alpha[index - 1], beta[index - 1])
+
+    alpha[~converged] = np.nan
+    beta[~converged] = np.nan
+    return [alpha.reshape(shape), beta.reshape(shape), converged.reshape(shape)]
+
+########################################################################
+
+# Take arrays of raw pressure measurements (dp0, dpa, dpb) in pascals,
+# and return arrays of the airdata parameters [alpha, beta, q], with the
+# angles in radians. Keyword arguments are passed to solve_angles().
+
+def probe_raw2data(dp0, dpa, dpb, geometry='v1', **kwargs):
+    dp0 = np.asarray(dp0, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        alpha, beta, converged = solve_angles(
+            np.asarray(dpa) / dp0,
+            np.asarray(dpb) / dp0,
+            geometry,
+            **kwargs)
+        dp0_over_q = probemodel.probe_data2raw(alpha, beta, 1.0, geometry)[0]
+        q = dp0 / dp0_over_q
+    return [alpha, beta, q]
+
+# Probe v1 version
+
+def v1_probe_raw2data(dp0, dpa, dpb, **kwargs):
+    return probe_raw2data(dp0, dpa, dpb, 'v1', **kwargs)
+
+# Probe v2 version
+
+def v2_probe_raw2data(dp0, dpa, dpb, **kwargs):
+    return probe_raw2data(dp0, dpa, dpb, 'v2', **kwargs)
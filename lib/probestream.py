@@ -0,0 +1,295 @@
+import asyncio
+import collections
+import socket
+import threading
+import time
+
+########################################################################
+
+# A long-lived connection to the sentence stream of a probe. The probe
+# serves comma separated sentences such as
+#
+#     $A,seq,baro,oat,dp0,dpA,dpB
+#
+# over TCP, one per line. Rather than connecting for every reading, a
+# ProbeStream keeps one connection open and a background thread reads
+# it in large chunks, keeping the most recent sentences of the wanted
+# kind in a bounded ring buffer, each with the time.monotonic() at which
+# it arrived ('prefix' None keeps every sentence). If the connection
+# fails, the thread reconnects.
+#
+# Readers take sentences from the buffer in order of arrival, so a read
+# returns at once if enough sentences are already waiting. mark() drops
+# everything received so far, for instance when the probe has just been
+# moved and older sentences describe the old position.
+#
+# AsyncProbeStream does the same as an asyncio task, for use from a
+# coroutine.
+
+DEFAULT_HOST = '192.168.4.1'
+DEFAULT_PORT = 80
+
+_CHUNK_SIZE = 65536
+
+########################################################################
+
+def _prefix_bytes(prefix):
+    return None if prefix is None else (prefix + ',').encode('ascii')
+
+# Split a chunk received after 'pending', the unfinished line of the
+# last chunk, into the complete sentences that start with 'prefix' and
+# the new unfinished line.
+
+def _split(pending, chunk, prefix):
+    lines = (pending + chunk).split(b'\n')
+    pending = lines.pop()
+    lines = [l.strip() for l in lines]
+    lines = [l.decode('ascii', 'replace') for l in lines
+             if len(l) > 0 and (prefix is None or l.startswith(prefix))]
+    return lines, pending
+
+# The buffer shared by both kinds of stream: sentences with their times
+# of arrival, the number of sentences ever received, and the number of
+# the next one to hand to a reader.
+
+class _Buffer:
+
+    def __init__(self, capacity):
+        self.sentences = collections.deque(maxlen=capacity)
+        self.received = 0
+        self.next = 0
+
+    def add(self, t, lines):
+        for l in lines:
+            self.sentences.append((t, l))
+        self.received += len(lines)
+
+    def mark(self):
+        self.next = self.received
+
+    # Move up to n - len(r) unread sentences that arrived after 'after'
+    # into the list r.
+
+    def take(self, r, n, after):
+        oldest = self.received - len(self.sentences)
+        self.next = max(self.next, oldest)
+        while self.next < self.received and len(r) < n:
+            (t, line) = self.sentences[self.next - oldest]
+            self.next += 1
+            if after is None or t > after:
+                r.append(line)
+
+########################################################################
+
+class ProbeStream:
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, prefix='$A',
+                 capacity=8192, timeout=5.0, reconnect_delay=1.0):
+        self.__address = (host, port)
+        self.__prefix = prefix
+        self.__timeout = timeout
+        self.__reconnect_delay = reconnect_delay
+        self.__buffer = _Buffer(capacity)
+        self.__connections = 0
+        self.__errors = 0
+        self.__condition = threading.Condition()
+        self.__stopping = threading.Event()
+        self.__socket = None
+        self.__thread = None
+
+    def start(self):
+        if self.__thread is not None:
+            return
+        self.__stopping.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def close(self):
+        self.__stopping.set()
+        s = self.__socket
+        if s is not None:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Counters for monitoring: sentences received, connections made and
+    # connection failures.
+
+    def stats(self):
+        with self.__condition:
+            return {
+                'received': self.__buffer.received,
+                'buffered': len(self.__buffer.sentences),
+                'connections': self.__connections,
+                'errors': self.__errors,
+            }
+
+    # Treat every sentence received so far as stale.
+
+    def mark(self):
+        with self.__condition:
+            self.__buffer.mark()
+
+    # The next n sentences, as a list of strings without line endings,
+    # waiting for them if need be. With 'after', a time.monotonic()
+    # value, sentences that arrived at or before that time are skipped
+    # first. If the buffer has overflowed since the last read, reading
+    # resumes at the oldest sentence still buffered. Raises TimeoutError
+    # if the sentences do not arrive within 'timeout' seconds, by default
+    # the connection timeout plus a second per sentence.
+
+    def read(self, n, after=None, timeout=None):
+        if timeout is None:
+            timeout = self.__timeout + n
+        deadline = time.monotonic() + timeout
+        r = []
+        with self.__condition:
+            while True:
+                self.__buffer.take(r, n, after)
+                if len(r) == n:
+                    return r
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('received %d of %d sentences from %s:%d' % (
+                        len(r), n, self.__address[0], self.__address[1]))
+                self.__condition.wait(remaining)
+
+    def __run(self):
+        while not self.__stopping.is_set():
+            try:
+                self.__socket = socket.create_connection(self.__address, self.__timeout)
+                with self.__condition:
+                    self.__connections += 1
+                self.__receive(self.__socket)
+            except OSError:
+                with self.__condition:
+                    self.__errors += 1
+            finally:
+                if self.__socket is not None:
+                    self.__socket.close()
+                    self.__socket = None
+            self.__stopping.wait(self.__reconnect_delay)
+
+    def __receive(self, s):
+        prefix = _prefix_bytes(self.__prefix)
+        pending = b''
+        while not self.__stopping.is_set():
+            try:
+                chunk = s.recv(_CHUNK_SIZE)
+            except socket.timeout:
+                # A silent probe is as good as a dead connection.
+                raise OSError('no data from %s:%d' % self.__address)
+            if len(chunk) == 0:
+                return
+            t = time.monotonic()
+            (lines, pending) = _split(pending, chunk, prefix)
+            if len(lines) == 0:
+                continue
+            with self.__condition:
+                self.__buffer.add(t, lines)
+                self.__condition.notify_all()
+
+########################################################################
+
+# The asyncio version of ProbeStream, with the same arguments. start()
+# must be called from a running event loop, and read() and close() are
+# coroutines.
+
+class AsyncProbeStream:
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, prefix='$A',
+                 capacity=8192, timeout=5.0, reconnect_delay=1.0):
+        self.__address = (host, port)
+        self.__prefix = prefix
+        self.__timeout = timeout
+        self.__reconnect_delay = reconnect_delay
+        self.__buffer = _Buffer(capacity)
+        self.__connections = 0
+        self.__errors = 0
+        self.__condition = asyncio.Condition()
+        self.__task = None
+
+    def start(self):
+        if self.__task is None:
+            self.__task = asyncio.get_running_loop().create_task(self.__run())
+
+    async def close(self):
+        if self.__task is None:
+            return
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__task = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def stats(self):
+        return {
+            'received': self.__buffer.received,
+            'buffered': len(self.__buffer.sentences),
+            'connections': self.__connections,
+            'errors': self.__errors,
+        }
+
+    def mark(self):
+        self.__buffer.mark()
+
+    async def read(self, n, after=None, timeout=None):
+        if timeout is None:
+            timeout = self.__timeout + n
+        r = []
+        def ready():
+            self.__buffer.take(r, n, after)
+            return len(r) == n
+        async with self.__condition:
+            try:
+                await asyncio.wait_for(self.__condition.wait_for(ready), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError('received %d of %d sentences from %s:%d' % (
+                    len(r), n, self.__address[0], self.__address[1]))
+        return r
+
+    async def __run(self):
+        prefix = _prefix_bytes(self.__prefix)
+        while True:
+            writer = None
+            try:
+                (reader, writer) = await asyncio.wait_for(
+                    asyncio.open_connection(*self.__address), self.__timeout)
+                self.__connections += 1
+                pending = b''
+                while True:
+                    chunk = await asyncio.wait_for(reader.read(_CHUNK_SIZE), self.__timeout)
+                    if len(chunk) == 0:
+                        break
+                    t = time.monotonic()
+                    (lines, pending) = _split(pending, chunk, prefix)
+                    if len(lines) == 0:
+                        continue
+                    async with self.__condition:
+                        self.__buffer.add(t, lines)
+                        self.__condition.notify_all()
+            except (OSError, asyncio.TimeoutError):
+                self.__errors += 1
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(self.__reconnect_delay)
@@ -0,0 +1,147 @@
+import json
+import numpy as np
+
+########################################################################
+
+# Inverse lookup tables for 5-hole probes. Solving for airdata from raw
+# pressures means a 2-D root find per sample. Instead, we solve once on
+# a regular grid of pressure ratios
+#
+#     (dpa / dp0, dpb / dp0) -> (alpha, beta, dp0 / q)
+#
+# save the grid, and answer queries for whole arrays of samples by
+# bilinear interpolation.
+#
+# A table is a dict of numpy arrays:
+#
+#     ra0, rb0    -- the grid axes, dpa / dp0 and dpb / dp0
+#     alpha, beta -- radians, indexed [ra0, rb0]
+#     dp0_over_q  -- indexed [ra0, rb0]
+#
+# and, for a table from load_or_build(), two more entries:
+#
+#     key         -- the description of the model the table was built
+#                    from, such as probemodel.model_key('v2')
+#     error       -- the table's interpolation_error(), measured when it
+#                    was built
+
+########################################################################
+
+def default_axis():
+    return np.arange(-1.25, 1.25, .025)
+
+# Build a table by calling 'raw2data' at every grid point. This is the
+# exact solver, with the signature
+#
+#     raw2data(dp0, dpa, dpb) -> [alpha, beta, q]
+
+def build(raw2data, ra0=None, rb0=None):
+    ra0 = default_axis() if ra0 is None else np.asarray(ra0, dtype=np.float64)
+    rb0 = default_axis() if rb0 is None else np.asarray(rb0, dtype=np.float64)
+    ra, rb = np.meshgrid(ra0, rb0, indexing='ij')
+    (alpha, beta, q) = np.vectorize(lambda a, b: tuple(raw2data(1.0, a, b)))(ra, rb)
+    return {
+        'ra0': ra0,
+        'rb0': rb0,
+        'alpha': alpha,
+        'beta': beta,
+        'dp0_over_q': 1.0 / q,
+    }
+
+# 'key' and 'error' are kept in the file as JSON.
+
+_JSON_ENTRIES = ['key', 'error']
+
+def save(table, filename):
+    table = dict(table)
+    for k in _JSON_ENTRIES:
+        if k in table:
+            table[k] = np.array(json.dumps(table[k], sort_keys=True))
+    np.savez(filename, **table)
+
+def load(filename):
+    with np.load(filename) as f:
+        table = dict((k, f[k]) for k in f.files)
+    for k in _JSON_ENTRIES:
+        if k in table:
+            table[k] = json.loads(str(table[k]))
+    return table
+
+# Load a table from 'filename', or build and save it if the file does
+# not exist or was built on different axes or from a model with a
+# different 'key'. The key must be JSON; pass everything 'raw2data'
+# depends on, such as probemodel.model_key(), so that a change to the
+# model rebuilds the table. The interpolation error of a new table is
+# measured once and saved with it.
+
+def load_or_build(filename, raw2data, ra0=None, rb0=None, key=None):
+    ra0 = default_axis() if ra0 is None else np.asarray(ra0, dtype=np.float64)
+    rb0 = default_axis() if rb0 is None else np.asarray(rb0, dtype=np.float64)
+    key = json.loads(json.dumps(key, sort_keys=True))
+    try:
+        table = load(filename)
+        if (np.array_equal(table['ra0'], ra0) and np.array_equal(table['rb0'], rb0) and
+                table['key'] == key and 'error' in table):
+            return table
+    except (IOError, KeyError, ValueError):
+        pass
+    table = build(raw2data, ra0, rb0)
+    table['key'] = key
+    table['error'] = interpolation_error(table, raw2data)
+    save(table, filename)
+    return table
+
+########################################################################
+
+# Interpolate the given table variable at arrays of ratios. Points
+# outside the grid are NaN.
+
+def _interpolate(table, name, ra, rb):
+    ra0 = table['ra0']
+    rb0 = table['rb0']
+    z = table[name]
+    i = np.clip(np.searchsorted(ra0, ra, side='right') - 1, 0, len(ra0) - 2)
+    j = np.clip(np.searchsorted(rb0, rb, side='right') - 1, 0, len(rb0) - 2)
+    u = (ra - ra0[i]) / (ra0[i + 1] - ra0[i])
+    v = (rb - rb0[j]) / (rb0[j + 1] - rb0[j])
+    result = ((1 - u) * (1 - v) * z[i, j] +
+              u * (1 - v) * z[i + 1, j] +
+              (1 - u) * v * z[i, j + 1] +
+              u * v * z[i + 1, j + 1])
+    outside = (ra < ra0[0]) | (ra > ra0[-1]) | (rb < rb0[0]) | (rb > rb0[-1])
+    return np.where(outside, np.nan, result)
+
+# The table version of raw2data. Takes arrays of raw pressures and
+# returns arrays [alpha, beta, q].
+
+def lookup(table, dp0, dpa, dpb):
+    dp0 = np.asarray(dp0, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ra = np.asarray(dpa, dtype=np.float64) / dp0
+        rb = np.asarray(dpb, dtype=np.float64) / dp0
+        alpha = _interpolate(table, 'alpha', ra, rb)
+        beta = _interpolate(table, 'beta', ra, rb)
+        q = dp0 / _interpolate(table, 'dp0_over_q', ra, rb)
+    return [alpha, beta, q]
+
+########################################################################
+
+# Measure the interpolation error of a table against the exact solver
+# at 'n' random points within the grid. Returns a dict mapping each of
+# 'alpha', 'beta' (radians) and 'dp0_over_q' to a tuple of the maximum
+# and RMS absolute error.
+
+def interpolation_error(table, raw2data, n=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    ra = rng.uniform(table['ra0'][0], table['ra0'][-1], n)
+    rb = rng.uniform(table['rb0'][0], table['rb0'][-1], n)
+    (alpha, beta, q) = lookup(table, np.ones(n), ra, rb)
+    exact = np.array([raw2data(1.0, a, b) for (a, b) in zip(ra, rb)])
+    errors = {
+        'alpha': np.abs(alpha - exact[:, 0]),
+        'beta': np.abs(beta - exact[:, 1]),
+        'dp0_over_q': np.abs(1.0 / q - 1.0 / exact[:, 2]),
+    }
+    return dict(
+        (k, (float(np.nanmax(e)), float(np.sqrt(np.nanmean(e * e)))))
+        for (k, e) in errors.items())
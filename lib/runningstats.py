@@ -0,0 +1,63 @@
+import numpy as np
+
+########################################################################
+
+# Running mean and variance of one or more channels, updated as samples
+# arrive, by Welford's method. Batches of samples are merged in one step
+# with the pairwise form of the same update (Chan et al.), so feeding a
+# reading a batch at a time costs no more than one pass over it, and
+# the result does not depend on how the samples were batched. Unlike
+# summing x and x^2, this keeps its precision when the mean is large
+# against the spread, as with pressures of 1e5 Pa varying by a few Pa.
+
+########################################################################
+
+class RunningStats:
+
+    def __init__(self, channels=1):
+        self.__count = 0
+        self.__mean = np.zeros(channels)
+        self.__m2 = np.zeros(channels)
+
+    # Add one sample, a value per channel.
+
+    def push(self, sample):
+        self.update(np.asarray(sample, dtype=np.float64).reshape(1, -1))
+
+    # Add a batch of samples, an array of shape (samples, channels).
+
+    def update(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        samples = samples.reshape(len(samples), -1)
+        n = len(samples)
+        if n == 0:
+            return
+        mean = np.mean(samples, axis=0)
+        m2 = np.sum((samples - mean) ** 2, axis=0)
+        total = self.__count + n
+        delta = mean - self.__mean
+        self.__mean = self.__mean + delta * (n / total)
+        self.__m2 = self.__m2 + m2 + delta * delta * (self.__count * n / total)
+        self.__count = total
+
+    def count(self):
+        return self.__count
+
+    def mean(self):
+        return self.__mean.copy()
+
+    # The variance of each channel, with 'ddof' as for np.var; NaN
+    # until there are more than 'ddof' samples.
+
+    def variance(self, ddof=1):
+        if self.__count <= ddof:
+            return np.full(len(self.__mean), np.nan)
+        return self.__m2 / (self.__count - ddof)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof))
+
+    # The standard error of each channel's mean.
+
+    def standard_error(self):
+        return self.std() / np.sqrt(max(self.__count, 1))
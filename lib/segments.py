@@ -0,0 +1,192 @@
+import json
+import os
+import numpy as np
+
+import filters
+
+########################################################################
+
+# Flight segment detection. Rather than picking the interesting part of
+# a log by eye, we split it into segments from its q and altitude:
+#
+#     taxi     -- on the ground below takeoff speed, taxiing or stopped
+#     takeoff  -- from the start of the takeoff roll until 50 ft above
+#                 the runway
+#     airborne -- from there until the last time the aircraft is 50 ft
+#                 above the runway it lands on
+#     landing  -- from there until the landing roll drops below takeoff
+#                 speed
+#     flight   -- from the start of a takeoff to the end of the landing
+#                 that follows it, overlapping the three above
+#
+# "Takeoff speed" is a q of more than 'fast_q' pascals above the lowest
+# q in the log, so a probe with a zero offset still works. Fast runs of
+# the log that never climb (a rejected takeoff, a fast taxi) count as
+# taxi.
+#
+# Segments are numbered from 1 within each kind, in time order, and
+# saved as a small JSON index next to the log so that later runs can go
+# straight to, say, airborne segment 1.
+
+# Bump this whenever a change to detect() changes its results.
+DETECTOR_VERSION = 1
+
+KINDS = ['taxi', 'takeoff', 'airborne', 'landing']
+
+DEFAULTS = {
+    'fast_q': 150.0,         # Pa above the ground baseline, about 30 kt
+    'height': 15.24,         # m, 50 ft
+    'smoothing': 2.0,        # s, centered moving average of q and alt
+    'min_duration': 5.0,     # s, shortest fast or slow run kept
+}
+
+########################################################################
+
+# Start and end (exclusive) indices of the runs of True in 'mask'.
+
+def _runs(mask):
+    d = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+
+# Drop runs of True shorter than 'min_duration' seconds, then fill runs
+# of False shorter than that between runs of True.
+
+def _debounce(mask, time, min_duration):
+    mask = mask.copy()
+    for value in [True, False]:
+        starts, ends = _runs(mask == value)
+        short = time[ends - 1] - time[starts] < min_duration
+        if not value:
+            # Only fill gaps with True on both sides.
+            short &= (starts > 0) & (ends < len(mask))
+        for (s, e) in zip(starts[short], ends[short]):
+            mask[s:e] = not value
+    return mask
+
+def _smooth(values, time, smoothing):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 2:
+        return values
+    window = int(max(1, min(len(values), round(smoothing / np.median(np.diff(time))))))
+    averaged = filters.moving_average(values, window)
+    return np.pad(averaged, (window // 2, window - 1 - window // 2), mode='edge')
+
+########################################################################
+
+# Detect the segments of a log given its time (s), q (Pa) and alt (m)
+# columns. Returns a list of dicts with keys 'kind', 'number', 'start'
+# and 'end', the latter being the times of the first and last samples.
+
+def detect(time, q, alt, **params):
+    p = dict(DEFAULTS)
+    p.update(params)
+    time = np.asarray(time, dtype=np.float64)
+    if len(time) == 0:
+        return []
+
+    q = np.nan_to_num(np.asarray(q, dtype=np.float64), nan=0.0)
+    q = _smooth(q, time, p['smoothing'])
+    alt = np.asarray(alt, dtype=np.float64)
+    alt = _smooth(np.where(np.isfinite(alt), alt, np.nanmedian(alt)), time, p['smoothing'])
+
+    fast = _debounce(q - np.percentile(q, 1) > p['fast_q'], time, p['min_duration'])
+
+    label = np.zeros(len(time), dtype=np.int8)
+    for (s, e) in zip(*_runs(fast)):
+        high = np.flatnonzero(alt[s:e] > alt[s] + p['height'])
+        if len(high) == 0:
+            continue
+        climbed = s + high[0]
+        high = np.flatnonzero(alt[s:e] > alt[e - 1] + p['height'])
+        if len(high) == 0:
+            continue
+        descended = s + high[-1] + 1
+        if descended <= climbed:
+            continue
+        label[s:climbed] = KINDS.index('takeoff')
+        label[climbed:descended] = KINDS.index('airborne')
+        label[descended:e] = KINDS.index('landing')
+
+    segments = []
+    counts = dict((k, 0) for k in KINDS + ['flight'])
+    changes = np.flatnonzero(np.diff(label)) + 1
+    starts = np.concatenate(([0], changes))
+    ends = np.concatenate((changes, [len(label)]))
+    flight_start = None
+    for (s, e) in zip(starts, ends):
+        kind = KINDS[label[s]]
+        counts[kind] += 1
+        segments.append({
+            'kind': kind,
+            'number': counts[kind],
+            'start': float(time[s]),
+            'end': float(time[e - 1]),
+        })
+        if kind == 'takeoff':
+            flight_start = float(time[s])
+        if kind == 'landing' and flight_start is not None:
+            counts['flight'] += 1
+            segments.append({
+                'kind': 'flight',
+                'number': counts['flight'],
+                'start': flight_start,
+                'end': float(time[e - 1]),
+            })
+            flight_start = None
+    return sorted(segments, key=lambda x: (x['start'], x['kind'] != 'flight'))
+
+def detect_dataset(dataset, **params):
+    return detect(dataset['time'], dataset['q'], dataset['alt'], **params)
+
+########################################################################
+
+def index_filename(filename):
+    return filename + '.segments.json'
+
+# The segments of the log 'filename', from its index if that is up to
+# date, otherwise detected and saved. 'read' is called with no arguments
+# only if detection is needed, and returns a dataset with 'time', 'q'
+# and 'alt' columns for the whole log.
+
+def load_or_detect(filename, read, **params):
+    p = dict(DEFAULTS)
+    p.update(params)
+    st = os.stat(filename)
+    key = {
+        'version': DETECTOR_VERSION,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'params': p,
+    }
+    try:
+        with open(index_filename(filename)) as f:
+            index = json.load(f)
+        if index['key'] == key:
+            return index['segments']
+    except (IOError, ValueError, KeyError):
+        pass
+    segments = detect_dataset(read(), **p)
+    try:
+        with open(index_filename(filename), 'w') as f:
+            json.dump({'key': key, 'segments': segments}, f, indent=2)
+    except IOError:
+        pass
+    return segments
+
+# The (start, end) times of segment 'number' of the given kind.
+
+def find(segments, kind, number=1):
+    for s in segments:
+        if s['kind'] == kind and s['number'] == number:
+            return (s['start'], s['end'])
+    raise KeyError('no %s segment %d' % (kind, number))
+
+# The rows of a dataset with times from 'start' to 'end' inclusive. The
+# time column must be sorted. Columns are sliced, not copied, so memory
+# mapped columns stay on disk outside the slice.
+
+def subset(dataset, start, end, time='time'):
+    t = dataset[time]
+    istart = np.searchsorted(t, start, side='left')
+    iend = np.searchsorted(t, end, side='right')
+    return dict((k, v[istart:iend]) for (k, v) in dataset.items())
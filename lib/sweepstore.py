@@ -0,0 +1,206 @@
+import csv
+import os
+import numpy as np
+
+########################################################################
+
+# Binary storage for probe sweeps. A sweep is a series of points, each
+# being the samples read at one (mph, alpha, beta). Rather than one CSV
+# row per sample, a sweep '<name>.sweep' is a file of blocks, one per
+# point, each a fixed size header followed by the point's samples as
+# packed little endian records:
+#
+#     header -- magic 'SWP1', number of samples (uint32), mph, alpha
+#               and beta (float64)
+#     sample -- seq (int64), baro, oat, dp0, dpA, dpB (float64)
+#
+# Appending a point writes one block. Alongside, '<name>.sweep.idx'
+# holds one fixed size record per point, (mph, alpha, beta, offset of
+# its samples, number of samples, standard error of the mean of dp0,
+# dpA and dpB), so a reader can find any point or speed, and see how
+# precisely each was measured, from the index, and memory map just the
+# samples it wants without scanning the file.
+#
+# The index is only appended after its block is written. If the two
+# disagree, say after a crash, the index is rebuilt from the block
+# headers, and an incomplete last block is dropped by the next append.
+
+EXTENSION = '.sweep'
+
+COLUMNS = ['seq', 'baro', 'oat', 'dp0', 'dpA', 'dpB']
+
+# The columns of the CSV layout that ProbeTest used to write.
+CSV_COLUMNS = ['mph', 'alpha', 'beta'] + COLUMNS
+
+_MAGIC = b'SWP1'
+
+_HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('rows', '<u4'),
+    ('mph', '<f8'),
+    ('alpha', '<f8'),
+    ('beta', '<f8'),
+])
+
+SAMPLE_DTYPE = np.dtype([('seq', '<i8')] + [(c, '<f8') for c in COLUMNS[1:]])
+
+INDEX_DTYPE = np.dtype([
+    ('mph', '<f8'),
+    ('alpha', '<f8'),
+    ('beta', '<f8'),
+    ('offset', '<i8'),
+    ('rows', '<i8'),
+] + [(c + '_se', '<f8') for c in COLUMNS[3:]])
+
+########################################################################
+
+def index_filename(filename):
+    return filename + '.idx'
+
+def _record(mph, alpha, beta, offset, samples):
+    n = len(samples)
+    se = [np.std(samples[c], ddof=1) / np.sqrt(n) if n > 1 else np.nan for c in COLUMNS[3:]]
+    return tuple([mph, alpha, beta, offset, n] + se)
+
+def _end(index):
+    if len(index) == 0:
+        return 0
+    return int(index['offset'][-1] + index['rows'][-1] * SAMPLE_DTYPE.itemsize)
+
+# Scan the block headers of a sweep file, stopping at the first block
+# that is damaged or incomplete.
+
+def _scan(filename):
+    records = []
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        offset = 0
+        while offset + _HEADER_DTYPE.itemsize <= size:
+            f.seek(offset)
+            h = np.frombuffer(f.read(_HEADER_DTYPE.itemsize), dtype=_HEADER_DTYPE)[0]
+            start = offset + _HEADER_DTYPE.itemsize
+            end = start + int(h['rows']) * SAMPLE_DTYPE.itemsize
+            if h['magic'] != _MAGIC or end > size:
+                break
+            samples = np.frombuffer(f.read(end - start), dtype=SAMPLE_DTYPE)
+            records.append(_record(h['mph'], h['alpha'], h['beta'], start, samples))
+            offset = end
+    return np.array(records, dtype=INDEX_DTYPE)
+
+# Rewrite the index of a sweep file from its block headers.
+
+def rebuild_index(filename):
+    index = _scan(filename)
+    with open(index_filename(filename), 'wb') as f:
+        f.write(index.tobytes())
+    return index
+
+# The index of a sweep file as a structured array with the fields of
+# INDEX_DTYPE, one record per point in the order they were appended.
+
+def read_index(filename):
+    if not os.path.isfile(filename):
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    try:
+        index = np.fromfile(index_filename(filename), dtype=INDEX_DTYPE)
+        if os.path.getsize(index_filename(filename)) % INDEX_DTYPE.itemsize != 0:
+            index = None
+    except (IOError, ValueError):
+        index = None
+    if index is None or _end(index) != os.path.getsize(filename):
+        index = rebuild_index(filename)
+    return index
+
+# Append a point: its mph, alpha and beta, and a dict with a column of
+# samples for each of COLUMNS. Other columns are ignored.
+
+def append_point(filename, mph, alpha, beta, columns):
+    rows = len(columns['seq'])
+    samples = np.zeros(rows, dtype=SAMPLE_DTYPE)
+    for c in COLUMNS:
+        samples[c] = columns[c]
+    header = np.array([(_MAGIC, rows, mph, alpha, beta)], dtype=_HEADER_DTYPE)
+
+    index = read_index(filename)
+    start = _end(index)
+    # Create the file if need be.
+    with open(filename, 'ab') as f:
+        pass
+    with open(filename, 'r+b') as f:
+        f.seek(start)
+        f.truncate()
+        f.write(header.tobytes())
+        f.write(samples.tobytes())
+    record = np.array([_record(mph, alpha, beta, start + _HEADER_DTYPE.itemsize, samples)], dtype=INDEX_DTYPE)
+    with open(index_filename(filename), 'r+b' if len(index) > 0 else 'wb') as f:
+        f.seek(len(index) * INDEX_DTYPE.itemsize)
+        f.truncate()
+        f.write(record.tobytes())
+
+########################################################################
+
+# The points of a sweep, as a dataset with columns 'mph', 'alpha',
+# 'beta', 'rows' (the number of samples) and 'dp0_se', 'dpA_se' and
+# 'dpB_se' (the standard errors of the means).
+
+def points(filename):
+    index = read_index(filename)
+    return dict((k, index[k].copy()) for k in index.dtype.names if k != 'offset')
+
+# The samples of a sweep as a dataset with the columns of CSV_COLUMNS,
+# for all points or only those with the given mph, alpha and/or beta.
+# Only the blocks of the matching points are read.
+
+def read_points(filename, mph=None, alpha=None, beta=None):
+    index = read_index(filename)
+    keep = np.ones(len(index), dtype=bool)
+    for (k, v) in [('mph', mph), ('alpha', alpha), ('beta', beta)]:
+        if v is not None:
+            keep &= index[k] == v
+    index = index[keep]
+
+    if len(index) == 0 or np.sum(index['rows']) == 0:
+        samples = np.zeros(0, dtype=SAMPLE_DTYPE)
+    else:
+        data = np.memmap(filename, dtype=np.uint8, mode='r')
+        samples = np.concatenate([
+            np.frombuffer(data, dtype=SAMPLE_DTYPE, count=int(r['rows']), offset=int(r['offset']))
+            for r in index])
+
+    d = {}
+    for k in ['mph', 'alpha', 'beta']:
+        d[k] = np.repeat(index[k], index['rows'])
+    for c in COLUMNS:
+        d[c] = samples[c]
+    return d
+
+########################################################################
+
+# Write a sweep in the CSV layout ProbeTest used to write, one row per
+# sample, for tools that expect it.
+
+def export_csv(filename, csv_filename):
+    d = read_points(filename)
+    table = np.column_stack([np.asarray(d[c], dtype=np.float64) for c in CSV_COLUMNS])
+    np.savetxt(
+        csv_filename, table,
+        fmt=['%g', '%g', '%g', '%d'] + ['%.12g'] * (len(COLUMNS) - 1),
+        delimiter=',', header=','.join(CSV_COLUMNS), comments='')
+
+# Append the samples of a CSV file in that layout to a sweep, as one
+# point per run of rows with the same mph, alpha and beta.
+
+def import_csv(csv_filename, filename):
+    with open(csv_filename) as f:
+        names = next(csv.reader(f))
+    table = np.loadtxt(csv_filename, delimiter=',', skiprows=1, ndmin=2)
+    if len(table) == 0:
+        return
+    d = dict((k, table[:, i]) for (i, k) in enumerate(names))
+    keys = np.column_stack([d['mph'], d['alpha'], d['beta']])
+    changes = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    starts = np.concatenate(([0], changes))
+    ends = np.concatenate((changes, [len(keys)]))
+    for (s, e) in zip(starts, ends):
+        append_point(filename, d['mph'][s], d['alpha'][s], d['beta'][s],
+                     dict((c, d[c][s:e]) for c in COLUMNS))
@@ -0,0 +1,216 @@
+import io
+import numpy as np
+
+########################################################################
+
+# Columnar reader for the comma separated logs we record from the probe
+# and from the various bench and car rigs. Each line is a row of numbers
+# such as:
+#
+#     1556477386.782,68,3255,100460.88,22.31,24.68,-1.28,-121.22
+#
+# Rather than a Python float() per cell, the lines are indexed in one
+# vectorized pass over the bytes of the file, rows that cannot be
+# numeric (too few fields, stray text) are set aside, and the rest are
+# handed in bulk to numpy's C tokenizer.
+
+# Bytes that may appear in a row of numbers, including the letters of
+# exponents, 'nan' and 'inf'.
+_NUMERIC = np.zeros(256, dtype=bool)
+for c in b'0123456789.+-eE, \t\r\nnaNAifIF':
+    _NUMERIC[c] = True
+
+# Lines up to this long are checked for being entirely whitespace.
+_SHORT_LINE = 8
+
+# Bump this whenever a change to the reader changes what it returns for
+# some file. Cached results (see cache.py) are keyed on it.
+PARSER_VERSION = 1
+
+########################################################################
+
+def _read_bytes(source):
+    if hasattr(source, 'read'):
+        data = source.read()
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+    if isinstance(data, str):
+        data = data.encode('ascii', 'replace')
+    if len(data) > 0 and not data.endswith(b'\n'):
+        data = data + b'\n'
+    return data
+
+def _split_header(data):
+    while True:
+        end = data.find(b'\n')
+        if end < 0:
+            return [], b''
+        line = data[:end].strip()
+        data = data[end + 1:]
+        if len(line) > 0:
+            names = [n.strip() for n in line.decode('ascii', 'replace').split(',')]
+            return names, data
+
+########################################################################
+
+# Find the start and end (the position of the '\n') of every line, its
+# number of fields, whether it is blank and whether it contains bytes
+# that cannot be part of a number.
+
+def _index_lines(data, b):
+    ends = np.flatnonzero(b == ord('\n'))
+    starts = np.empty(len(ends), dtype=np.intp)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    commas_before_end = np.searchsorted(np.flatnonzero(b == ord(',')), ends)
+    nfields = np.diff(commas_before_end, prepend=0) + 1
+
+    blank = np.zeros(len(ends), dtype=bool)
+    for i in np.flatnonzero(ends - starts <= _SHORT_LINE):
+        blank[i] = len(data[starts[i]:ends[i]].strip()) == 0
+
+    # Only bytes outside '+' to '9' need the full table lookup.
+    unusual = np.flatnonzero((b - np.uint8(ord('+'))) > np.uint8(ord('9') - ord('+')))
+    textual = np.zeros(len(ends), dtype=bool)
+    textual[np.searchsorted(ends, unusual[~_NUMERIC[b[unusual]]])] = True
+
+    return starts, ends, nfields, blank, textual
+
+# Join the given lines back into one buffer.
+
+def _gather_lines(data, b, starts, ends):
+    if len(starts) == 0:
+        return b''
+    if np.all(starts[1:] == ends[:-1] + 1):
+        return data[starts[0]:ends[-1] + 1]
+    lengths = ends - starts + 1
+    offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+    return b[np.arange(np.sum(lengths)) + offsets].tobytes()
+
+def _first_and_last_lines_match(data):
+    stripped = data.strip()
+    first = stripped[:stripped.find(b'\n')] if b'\n' in stripped else stripped
+    last = stripped[stripped.rfind(b'\n') + 1:]
+    return first.count(b',') == last.count(b',')
+
+def _load(data, usecols):
+    return np.loadtxt(
+        io.BytesIO(data),
+        delimiter=',',
+        comments=None,
+        usecols=usecols,
+        ndmin=2)
+
+# Parse the given lines with numpy. If numpy rejects the block, it is
+# bisected until the offending lines are found, so a handful of bad
+# rows cost a handful of extra parses rather than one exception per
+# row. Returns the parsed rows and a mask of the lines they came from.
+
+def _parse_lines(data, b, starts, ends, usecols, ncols):
+    rows = np.empty((len(starts), ncols))
+    ok = np.ones(len(starts), dtype=bool)
+
+    def parse(lo, hi):
+        if lo == hi:
+            return
+        try:
+            block = _load(_gather_lines(data, b, starts[lo:hi], ends[lo:hi]), usecols)
+            rows[lo:hi] = block[:, :ncols]
+        except ValueError:
+            if hi - lo == 1:
+                ok[lo] = False
+            else:
+                mid = (lo + hi) // 2
+                parse(lo, mid)
+                parse(mid, hi)
+
+    parse(0, len(starts))
+    return rows, ok
+
+########################################################################
+
+# Read the given columns of a comma separated log. The source may be a
+# file name or an open file (text or binary). Returns a dict of
+# contiguous numpy arrays keyed by column name.
+#
+#     cols        -- names of the columns to return. Without 'usecols'
+#                    or 'header', these are the leading fields of each
+#                    row, in order.
+#     dtype       -- a numpy dtype for all columns, or a dict mapping
+#                    column names to dtypes (missing names get float64).
+#     usecols     -- the field index of each entry in 'cols'. Only those
+#                    fields need to be numeric, so tagged sentences such
+#                    as '1602260158.26,$B,4156.0,...' can be read.
+#     header      -- if True, the first non-blank line names the fields
+#                    and 'cols' are looked up by name. With a header,
+#                    'cols' may be None to read every field.
+#
+# A row is kept only if every field it needs converts to a number. As
+# with the old row-by-row reader, without 'usecols' every field of the
+# row must be numeric and the row must have at least len(cols) fields.
+# Blank lines are ignored. If 'return_skipped' is True, the result is a
+# tuple of the columns and the number of non-blank rows that were
+# skipped as malformed.
+
+def read_columns(source, cols, dtype=np.float64, usecols=None, header=False, return_skipped=False):
+    data = _read_bytes(source)
+
+    if header:
+        names, data = _split_header(data)
+        if cols is None:
+            cols = names
+        usecols = [names.index(c) for c in cols]
+
+    if not isinstance(dtype, dict):
+        dtype = dict((c, dtype) for c in cols)
+
+    rows = np.empty((0, len(cols)))
+    skipped = 0
+
+    # A well-formed log parses in a single call. Anything else goes
+    # through the line index. A capture cut off mid-line is the usual
+    # way a log is malformed, so that is checked for up front.
+    if len(data) > 0 and _first_and_last_lines_match(data):
+        try:
+            whole = _load(data, usecols)
+            if whole.shape[1] >= len(cols):
+                rows = whole[:, :len(cols)]
+                data = b''
+        except ValueError:
+            pass
+
+    if len(data) > 0:
+        b = np.frombuffer(data, dtype=np.uint8)
+        starts, ends, nfields, blank, textual = _index_lines(data, b)
+        if usecols is None:
+            # Every field of the row must be numeric, so rows are parsed
+            # whole, grouped by their number of fields.
+            candidate = ~blank & ~textual & (nfields >= len(cols))
+            groups = [(n, None) for n in np.flatnonzero(np.bincount(nfields[candidate]))]
+        else:
+            candidate = ~blank & (nfields > max(usecols))
+            groups = [(None, list(usecols))]
+        parsed = []
+        order = []
+        for (n, group_usecols) in groups:
+            lines = np.flatnonzero(candidate if n is None else candidate & (nfields == n))
+            group_rows, ok = _parse_lines(
+                data, b, starts[lines], ends[lines],
+                group_usecols, len(cols))
+            parsed.append(group_rows[ok])
+            order.append(lines[ok])
+        if len(parsed) == 1:
+            rows = parsed[0]
+        elif len(parsed) > 1:
+            rows = np.concatenate(parsed)[np.argsort(np.concatenate(order), kind='stable')]
+        skipped = np.count_nonzero(~blank) - len(rows)
+
+    result = {}
+    for (i, c) in enumerate(cols):
+        result[c] = np.ascontiguousarray(rows[:, i], dtype=dtype.get(c, np.float64))
+
+    if return_skipped:
+        return result, int(skipped)
+    return result
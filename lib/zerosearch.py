@@ -0,0 +1,202 @@
+import numpy as np
+
+########################################################################
+
+# Search for the zero of a probe on an altazimuth mount: the (az, el) at
+# which dpB and dpA are both zero, that is, where alpha and beta are.
+#
+# Near the zero both channels are close to linear in az and el, so every
+# reading taken so far is used in a weighted least squares fit of
+#
+#     dpB = b0 + b_az * az + b_el * el
+#     dpA = a0 + a_az * az + a_el * el
+#
+# weighting each reading by the standard error of its mean. The zero is
+# where both fitted planes cross zero, and its standard error follows
+# from the covariance of the fitted coefficients. Coupling between the
+# axes (a mount that is not quite square) is fitted rather than assumed
+# away.
+#
+# The first readings are a plus sign of 'step' degrees around the
+# guess. After that, each next position is the one, from a ring around
+# the current estimate, that would most reduce the variance of the zero
+# if read with the typical noise seen so far. The search stops once the
+# standard error of the zero is below 'tolerance' degrees on both axes,
+# or after 'max_readings' readings.
+#
+# Only readings within 'radius' degrees of the current estimate are
+# fitted, once there are enough of them, so the first readings of a
+# poor guess do not bend the fit with the probe's nonlinearity.
+
+DEFAULTS = {
+    'step': 8.0,
+    'tolerance': 0.1,
+    'max_readings': 20,
+    'radius': 16.0,
+    'limit': 45.0,
+}
+
+# The number of readings needed for a fit, and the directions of the
+# candidate next positions.
+_MIN_READINGS = 4
+_DIRECTIONS = 8
+
+########################################################################
+
+def _design(az_el):
+    az_el = np.asarray(az_el, dtype=np.float64).reshape(-1, 2)
+    return np.column_stack([np.ones(len(az_el)), az_el])
+
+# Weighted least squares of y on the rows of x. Returns the coefficients,
+# the information matrix x' W x, and the factor by which the scatter of
+# the residuals exceeds what the standard errors predict (at least 1).
+
+def _fit(x, y, se):
+    w = 1.0 / (se * se)
+    information = np.einsum('n,nk,nl->kl', w, x, x)
+    coefficients = np.linalg.solve(information, np.einsum('n,nk,n->k', w, x, y))
+    r = y - x.dot(coefficients)
+    dof = len(y) - x.shape[1]
+    scale = 1.0
+    if dof > 0:
+        scale = max(1.0, np.sum(w * r * r) / dof)
+    return coefficients, information, scale
+
+# The zero of two fitted planes, and the Jacobians of the zero with
+# respect to the coefficients of each.
+
+def _root(b, a):
+    m = np.array([b[1:], a[1:]])
+    zero = np.linalg.solve(m, -np.array([b[0], a[0]]))
+    inverse = np.linalg.inv(m)
+    row = np.concatenate(([1.0], zero))
+    return zero, -np.outer(inverse[:, 0], row), -np.outer(inverse[:, 1], row)
+
+def _zero_covariance(jb, cov_b, ja, cov_a):
+    return jb.dot(cov_b).dot(jb.T) + ja.dot(cov_a).dot(ja.T)
+
+########################################################################
+
+class ZeroSearch:
+
+    def __init__(self, guess, **params):
+        self.__p = dict(DEFAULTS)
+        self.__p.update(params)
+        self.__guess = np.array(guess, dtype=np.float64)
+        self.__positions = []
+        self.__readings = []
+        self.__estimate = None
+
+    # Record a reading: the mean dpA and dpB at 'az_el', and the
+    # standard errors of those means.
+
+    def add(self, az_el, dpA, dpB, dpA_se, dpB_se):
+        self.__positions.append([float(az_el[0]), float(az_el[1])])
+        self.__readings.append([dpA, dpB, dpA_se, dpB_se])
+        self.__estimate = None
+
+    def count(self):
+        return len(self.__readings)
+
+    # The current estimate, as a tuple ([az, el], [az standard error,
+    # el standard error]), or None if there are too few readings or
+    # they do not determine a zero.
+
+    def estimate(self):
+        if self.__estimate is None:
+            self.__estimate = self.__solve()
+        if self.__estimate is None:
+            return None
+        return self.__estimate['zero'].tolist(), self.__estimate['se'].tolist()
+
+    def done(self):
+        if self.count() >= self.__p['max_readings']:
+            return True
+        e = self.estimate()
+        return e is not None and max(e[1]) < self.__p['tolerance']
+
+    # Where to take the next reading, or None once the search is done.
+
+    def next_position(self):
+        if self.done():
+            return None
+        step = self.__p['step']
+        g = self.__guess
+        start = [[g[0] - step, g[1]], [g[0] + step, g[1]], [g[0], g[1] - step], [g[0], g[1] + step]]
+        if self.count() < len(start):
+            return self.__clip(start[self.count()])
+        if self.estimate() is None:
+            # The readings do not determine a zero yet; widen the plus.
+            return self.__clip(g + 1.5 * (np.array(start[self.count() % 4]) - g))
+        return self.__clip(self.__best_candidate())
+
+    def __clip(self, az_el):
+        return np.clip(az_el, -self.__p['limit'], self.__p['limit']).tolist()
+
+    def __arrays(self):
+        positions = np.array(self.__positions)
+        readings = np.array(self.__readings, dtype=np.float64)
+        se = readings[:, 2:4]
+        # A reading with no scatter at all would take all the weight.
+        floor = 1e-3 * max(np.median(se), 1e-9)
+        return positions, readings[:, 0:2], np.maximum(se, floor)
+
+    def __solve(self):
+        if self.count() < _MIN_READINGS:
+            return None
+        positions = np.array(self.__positions)
+        e = self.__fit(np.ones(len(positions), dtype=bool))
+        if e is None:
+            return None
+        near = np.hypot(*(positions - e['zero']).T) <= self.__p['radius']
+        if np.sum(near) >= _MIN_READINGS and not np.all(near):
+            e_near = self.__fit(near)
+            if e_near is not None:
+                return e_near
+        return e
+
+    def __fit(self, use):
+        (positions, means, se) = self.__arrays()
+        x = _design(positions[use])
+        try:
+            (a, info_a, scale_a) = _fit(x, means[use, 0], se[use, 0])
+            (b, info_b, scale_b) = _fit(x, means[use, 1], se[use, 1])
+            (zero, jb, ja) = _root(b, a)
+            cov_a = np.linalg.inv(info_a) * scale_a
+            cov_b = np.linalg.inv(info_b) * scale_b
+        except np.linalg.LinAlgError:
+            return None
+        return {
+            'zero': zero,
+            'se': np.sqrt(np.diag(_zero_covariance(jb, cov_b, ja, cov_a))),
+            'use': use,
+            'info_a': info_a,
+            'info_b': info_b,
+            'scale_a': scale_a,
+            'scale_b': scale_b,
+            'jb': jb,
+            'ja': ja,
+        }
+
+    # The position on a ring of 'step' degrees around the estimate, or
+    # the estimate itself, that minimizes the predicted variance of the
+    # zero after one more reading with the median noise of those so far.
+
+    def __best_candidate(self):
+        e = self.__estimate
+        (positions, means, se) = self.__arrays()
+        noise = np.median(se[e['use']], axis=0)
+        angles = 2 * np.pi * np.arange(_DIRECTIONS) / _DIRECTIONS
+        candidates = e['zero'] + self.__p['step'] * np.column_stack([np.cos(angles), np.sin(angles)])
+        candidates = np.vstack([e['zero'], candidates])
+        candidates = np.clip(candidates, -self.__p['limit'], self.__p['limit'])
+        x = _design(candidates)
+        best = None
+        for k in range(0, len(candidates)):
+            xx = np.outer(x[k], x[k])
+            cov_a = np.linalg.inv(e['info_a'] + xx / noise[0] ** 2) * e['scale_a']
+            cov_b = np.linalg.inv(e['info_b'] + xx / noise[1] ** 2) * e['scale_b']
+            v = np.trace(_zero_covariance(e['jb'], cov_b, e['ja'], cov_a))
+            if best is None or v < best[0]:
+                best = (v, candidates[k])
+        return best[1]